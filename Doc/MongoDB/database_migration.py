@@ -280,6 +280,23 @@ def verify_database_integrity():
         return False
 
 
+def denormalize_transactions():
+    """
+    Copy user and plan display names onto existing transactions.
+    
+    Returns:
+        bool: True if the backfill succeeded, False otherwise
+    """
+    logger.info("Denormalizing transaction display fields...")
+    
+    transaction_model = Transaction()
+    if not transaction_model.backfill_denormalized_fields():
+        return False
+    
+    logger.info("Transaction display fields denormalized")
+    return True
+
+
 def main():
     """Main migration function."""
     parser = argparse.ArgumentParser(description="Database Migration Tool for Travian Whispers")
@@ -288,6 +305,7 @@ def main():
     parser.add_argument("--init-data", action="store_true", help="Initialize default data")
     parser.add_argument("--clean", action="store_true", help="Remove test/mock data")
     parser.add_argument("--verify", action="store_true", help="Verify database integrity")
+    parser.add_argument("--denormalize", action="store_true", help="Backfill denormalized transaction fields")
     parser.add_argument("--all", action="store_true", help="Perform all operations")
     
     args = parser.parse_args()
@@ -327,6 +345,11 @@ def main():
             logger.error("Failed to verify database integrity")
             sys.exit(1)
             
+    if args.all or args.denormalize:
+        if not denormalize_transactions():
+            logger.error("Failed to denormalize transactions")
+            sys.exit(1)
+            
     logger.info("Database migration completed successfully")
     
 
@@ -21,6 +21,15 @@ SECRET_KEY = os.getenv("SECRET_KEY", secrets.token_hex(32))
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017/whispers")
 MONGODB_DB_NAME = os.getenv("MONGODB_DB_NAME", "whispers")
 
+# Connection pool: one pool per process, shared by every model. maxPoolSize caps
+# concurrent operations per process (size it to worker threads), minPoolSize keeps
+# warm sockets for bursts, and waitQueueTimeoutMS bounds how long a request waits
+# for a free connection before failing fast
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "50"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "10"))
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "2500"))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+
 # JWT settings
 JWT_SECRET = os.getenv("JWT_SECRET", SECRET_KEY)
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
@@ -37,4 +46,11 @@ EMAIL_FROM = os.getenv("EMAIL_FROM", "Travian Whispers <noreply@travianwhispers.
 PAYPAL_CLIENT_ID = os.getenv("PAYPAL_CLIENT_ID", "")
 PAYPAL_SECRET = os.getenv("PAYPAL_SECRET", "")
 PAYPAL_MODE = os.getenv("PAYPAL_MODE", "sandbox")
-PAYPAL_BASE_URL = "https://api-m.sandbox.paypal.com" if PAYPAL_MODE == "sandbox" else "https://api-m.paypal.com"
\ No newline at end of file
+PAYPAL_BASE_URL = "https://api-m.sandbox.paypal.com" if PAYPAL_MODE == "sandbox" else "https://api-m.paypal.com"
+# Cache settings: a Redis URL shares background job state between worker
+# processes; without one each process keeps its own in-memory cache, so
+# deployments with more than one worker process must set it
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "")
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "600"))  # seconds a finished job stays pollable
+BROWSER_JOB_WORKERS = int(os.getenv("BROWSER_JOB_WORKERS", "2"))  # concurrent Selenium sessions per process
+BROWSER_JOB_QUEUE_SIZE = int(os.getenv("BROWSER_JOB_QUEUE_SIZE", "8"))  # jobs allowed to wait for a worker
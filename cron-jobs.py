@@ -32,7 +32,7 @@ def check_expired_subscriptions():
     
     try:
         # Connect to database if not already connected
-        if not db.get_db():
+        if db.get_db() is None:
             db.connect()
         
         # Initialize models
@@ -41,24 +41,22 @@ def check_expired_subscriptions():
         # Get current time
         now = datetime.utcnow()
         
-        # Find users with expired subscriptions
+        # Find users with expired subscriptions (only what the emails need)
         users_collection = db.get_collection("users")
-        expired_users = users_collection.find({
-            "subscription.status": "active",
-            "subscription.endDate": {"$lt": now}
-        })
+        expired_users = list(users_collection.find(
+            {
+                "subscription.status": "active",
+                "subscription.endDate": {"$lt": now}
+            },
+            {"email": 1, "username": 1}
+        ))
+        
+        # Update subscription status to expired for all of them at once
+        count = user_model.bulk_update_subscription_status(
+            [user["_id"] for user in expired_users], "expired"
+        )
         
-        count = 0
         for user in expired_users:
-            # Update subscription status to expired
-            users_collection.update_one(
-                {"_id": user["_id"]},
-                {"$set": {
-                    "subscription.status": "expired",
-                    "updatedAt": now
-                }}
-            )
-            
             # Send expiry email
             try:
                 send_subscription_expiry_email(
@@ -67,14 +65,13 @@ def check_expired_subscriptions():
                 )
             except Exception as e:
                 logger.error(f"Failed to send expiry email to {user['email']}: {e}")
-            
-            count += 1
         
         logger.info(f"Updated {count} expired subscriptions.")
     except Exception as e:
         logger.error(f"Error checking expired subscriptions: {e}")
     finally:
         # Don't disconnect as the connection is shared
+        pass
 
 def send_renewal_reminders():
     """
@@ -85,7 +82,7 @@ def send_renewal_reminders():
     
     try:
         # Connect to database if not already connected
-        if not db.get_db():
+        if db.get_db() is None:
             db.connect()
         
         # Initialize models
@@ -133,6 +130,7 @@ def send_renewal_reminders():
         logger.error(f"Error sending renewal reminders: {e}")
     finally:
         # Don't disconnect as the connection is shared
+        pass
 
 def cleanup_old_tokens():
     """
@@ -143,7 +141,7 @@ def cleanup_old_tokens():
     
     try:
         # Connect to database if not already connected
-        if not db.get_db():
+        if db.get_db() is None:
             db.connect()
         
         # Get current time
@@ -181,6 +179,7 @@ def cleanup_old_tokens():
         logger.error(f"Error cleaning up tokens: {e}")
     finally:
         # Don't disconnect as the connection is shared
+        pass
 
 def generate_admin_report():
     """
@@ -191,7 +190,7 @@ def generate_admin_report():
     
     try:
         # Connect to database if not already connected
-        if not db.get_db():
+        if db.get_db() is None:
             db.connect()
         
         # Initialize models
@@ -251,6 +250,7 @@ def generate_admin_report():
         logger.error(f"Error generating admin report: {e}")
     finally:
         # Don't disconnect as the connection is shared
+        pass
 
 def run_scheduler():
     """Run the scheduler in a separate thread."""
@@ -259,6 +259,9 @@ def run_scheduler():
     schedule.every().day.at("12:00").do(send_renewal_reminders)
     schedule.every().monday.at("03:00").do(cleanup_old_tokens)
     schedule.every().sunday.at("06:00").do(generate_admin_report)
+    schedule.every(15).minutes.do(rotate_ips)
+    schedule.every(2).hours.do(check_proxy_health)
+    schedule.every(6).hours.do(fetch_new_proxies)
     
     # Run continuously
     while True:
@@ -273,7 +276,6 @@ def start_scheduler():
     return scheduler_thread
 
 # IP rotation job
-@scheduler.scheduled_job('interval', minutes=15)
 def rotate_ips():
     from utils.rotation_strategy import RotationStrategy
     
@@ -283,7 +285,6 @@ def rotate_ips():
     logger.info(f"Scheduled IP rotation: {rotated} IPs rotated")
 
 # Proxy health check job
-@scheduler.scheduled_job('interval', hours=2)
 def check_proxy_health():
     from utils.proxy_metrics import ProxyHealthCheck
     
@@ -296,7 +297,6 @@ def check_proxy_health():
                 f"{len(actions['rotated'])} rotated")
 
 # Fetch new proxies job
-@scheduler.scheduled_job('interval', hours=6)
 def fetch_new_proxies():
     from database.models.proxy_service import ProxyService
     
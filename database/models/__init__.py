@@ -1 +1,46 @@
 """Package initialization."""
+import importlib
+import threading
+
+
+class _SharedModel:
+    """
+    Shared model instance (binds its collection once), created on first use.
+    
+    Model modules import this package, so building instances eagerly here
+    would be circular. An instance whose database was unreachable has no
+    collection; it is rebuilt on the next use instead of being kept for the
+    life of the process.
+    """
+    
+    def __init__(self, module_name, class_name):
+        self._module_name = module_name
+        self._class_name = class_name
+        self._instance = None
+        self._lock = threading.Lock()
+    
+    def _resolve(self):
+        """
+        Get the model instance, (re)creating it while it has no collection.
+        
+        Returns:
+            object: Model instance
+        """
+        instance = self._instance
+        if instance is None or instance.collection is None:
+            with self._lock:
+                instance = self._instance
+                if instance is None or instance.collection is None:
+                    model_class = getattr(importlib.import_module(self._module_name), self._class_name)
+                    instance = model_class()
+                    self._instance = instance
+        return instance
+    
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+
+user_model = _SharedModel('database.models.user', 'User')
+plan_model = _SharedModel('database.models.subscription', 'SubscriptionPlan')
+activity_model = _SharedModel('database.models.activity_log', 'ActivityLog')
+transaction_model = _SharedModel('database.models.transaction', 'Transaction')
@@ -23,6 +23,39 @@ class ActivityLog:
         if db is not None:
             self.collection = db["activity_logs"]
     
+    @staticmethod
+    def build_entry(user_id, activity_type, details=None, status='success', village=None, data=None):
+        """
+        Build an activity log document without storing it.
+        
+        Args:
+            user_id (str): User ID
+            activity_type (str): Type of activity (e.g., 'auto-farm', 'troop-training', 'login', 'profile-update')
+            details (str): Details of the activity
+            status (str): Status of the activity (success, warning, error, info)
+            village (str): Village name or ID (optional)
+            data (dict): Additional data for the activity (optional)
+        
+        Returns:
+            dict: Activity log document
+        """
+        log_entry = {
+            'userId': user_id,
+            'activityType': activity_type,
+            'details': details or f"{activity_type.replace('-', ' ').title()} activity",
+            'status': status,
+            'timestamp': datetime.utcnow()
+        }
+        
+        # Add optional fields
+        if village:
+            log_entry['village'] = village
+        
+        if data:
+            log_entry['data'] = data
+        
+        return log_entry
+    
     def log_activity(self, user_id, activity_type, details=None, status='success', village=None, data=None):
         """
         Log a user activity.
@@ -44,20 +77,7 @@ class ActivityLog:
                 return False
                 
             # Create log entry
-            log_entry = {
-                'userId': user_id,
-                'activityType': activity_type,
-                'details': details or f"{activity_type.replace('-', ' ').title()} activity",
-                'status': status,
-                'timestamp': datetime.utcnow()
-            }
-            
-            # Add optional fields
-            if village:
-                log_entry['village'] = village
-            
-            if data:
-                log_entry['data'] = data
+            log_entry = self.build_entry(user_id, activity_type, details, status, village, data)
             
             # Insert log entry
             result = self.collection.insert_one(log_entry)
@@ -3,8 +3,16 @@ Subscription plan model for MongoDB integration.
 """
 from datetime import datetime
 from bson import ObjectId
+from cachelib import SimpleCache
 from database.mongodb import MongoDB
 
+# Plans are few and rarely change, so ID lookups and the full list are cached per
+# process for a few minutes. Entries are dropped as soon as a plan is created,
+# updated or deleted here.
+PLAN_CACHE_TIMEOUT = 300
+_plan_cache = SimpleCache(threshold=256, default_timeout=PLAN_CACHE_TIMEOUT)
+_PLAN_LIST_KEY = '__all__'
+
 class SubscriptionPlan:
     """Subscription plan model for Travian Whispers."""
     
@@ -50,6 +58,7 @@ class SubscriptionPlan:
                     features[feature] = False  # Default value
         
         # Create plan document
+        now = datetime.utcnow()
         plan = {
             "name": name,
             "description": description,
@@ -58,14 +67,15 @@ class SubscriptionPlan:
                 "yearly": float(yearly_price)
             },
             "features": features,
-            "createdAt": datetime.utcnow(),
-            "updatedAt": datetime.utcnow()
+            "createdAt": now,
+            "updatedAt": now
         }
         
         try:
             result = self.collection.insert_one(plan)
             if result.inserted_id:
                 plan["_id"] = result.inserted_id
+                _plan_cache.delete(_PLAN_LIST_KEY)
                 return plan
         except Exception as e:
             print(f"Error creating plan: {e}")
@@ -90,6 +100,94 @@ class SubscriptionPlan:
             print(f"Error getting plan by ID: {e}")
             return None
     
+    def get_plans_by_ids(self, plan_ids):
+        """
+        Get several plans in a single query.
+        
+        Args:
+            plan_ids (iterable): Plan IDs (str or ObjectId)
+            
+        Returns:
+            dict: Plan documents keyed by their ID as a string
+        """
+        if self.collection is None:
+            return {}
+        
+        try:
+            object_ids = [ObjectId(str(plan_id)) for plan_id in set(map(str, plan_ids))]
+            if not object_ids:
+                return {}
+            
+            return {str(plan['_id']): plan for plan in self.collection.find({"_id": {"$in": object_ids}})}
+        except Exception as e:
+            print(f"Error getting plans by ID: {e}")
+            return {}
+    
+    def get_plan_by_id_cached(self, plan_id):
+        """
+        Get a plan by ID, served from the in-process plan cache when possible.
+        
+        Intended for display lookups; code that edits a plan should read it
+        with get_plan_by_id instead.
+        
+        Args:
+            plan_id (str): Plan ID
+            
+        Returns:
+            dict: Plan document (a private copy) or None if not found
+        """
+        key = str(plan_id)
+        plan = _plan_cache.get(key)
+        
+        if plan is None:
+            plan = self.get_plan_by_id(plan_id)
+            if plan is not None:
+                _plan_cache.set(key, plan)
+        
+        return plan
+    
+    def get_plan_with_active_subscriber(self, plan_id):
+        """
+        Get a plan by ID together with whether anyone actively subscribes to it.
+        
+        The lookup stops at the first active subscriber, so the result stays
+        one small document however popular the plan is.
+        
+        Args:
+            plan_id (str): Plan ID
+            
+        Returns:
+            dict: Plan name and ``has_active_users``, or None if not found
+        """
+        if self.collection is None:  # Explicit None check
+            return None
+            
+        try:
+            pipeline = [
+                {"$match": {"_id": ObjectId(plan_id)}},
+                {"$lookup": {
+                    "from": "users",
+                    "let": {"planId": "$_id"},
+                    "pipeline": [
+                        {"$match": {"$expr": {"$and": [
+                            {"$eq": ["$subscription.planId", "$$planId"]},
+                            {"$eq": ["$subscription.status", "active"]}
+                        ]}}},
+                        {"$limit": 1},
+                        {"$project": {"_id": 1}}
+                    ],
+                    "as": "activeUsers"
+                }},
+                {"$project": {
+                    "name": 1,
+                    "has_active_users": {"$gt": [{"$size": "$activeUsers"}, 0]}
+                }}
+            ]
+            return next(self.collection.aggregate(pipeline), None)
+        except Exception as e:
+            print(f"Error getting plan with active subscriber: {e}")
+            return None
+    
     def get_plan_by_name(self, name):
         """
         Get a plan by name.
@@ -132,6 +230,7 @@ class SubscriptionPlan:
                 {"_id": ObjectId(plan_id)},
                 {"$set": update_data}
             )
+            _plan_cache.delete_many(str(plan_id), _PLAN_LIST_KEY)
             
             return result.modified_count > 0
         except Exception as e:
@@ -153,15 +252,19 @@ class SubscriptionPlan:
             
         try:
             result = self.collection.delete_one({"_id": ObjectId(plan_id)})
+            _plan_cache.delete_many(str(plan_id), _PLAN_LIST_KEY)
             return result.deleted_count > 0
         except Exception as e:
             print(f"Error deleting plan: {e}")
             return False
     
-    def list_plans(self):
+    def list_plans(self, batch_size=200):
         """
         List all subscription plans.
         
+        Args:
+            batch_size (int): Cursor batch size; plans are few, so one batch suffices
+        
         Returns:
             list: List of plan documents
         """
@@ -169,12 +272,28 @@ class SubscriptionPlan:
             return []
             
         try:
-            cursor = self.collection.find().sort("price.monthly", 1)
+            cursor = self.collection.find().sort("price.monthly", 1).batch_size(batch_size)
             return list(cursor)
         except Exception as e:
             print(f"Error listing plans: {e}")
             return []
     
+    def list_plans_cached(self):
+        """
+        List all subscription plans, served from the in-process plan cache when possible.
+        
+        Returns:
+            list: List of plan documents (private copies)
+        """
+        plans = _plan_cache.get(_PLAN_LIST_KEY)
+        
+        if plans is None:
+            plans = self.list_plans()
+            if plans:
+                _plan_cache.set(_PLAN_LIST_KEY, plans)
+        
+        return plans
+    
     def create_default_plans(self):
         """
         Create default subscription plans if none exist.
@@ -186,10 +305,12 @@ class SubscriptionPlan:
             return False
         
         # Check if plans already exist
-        if self.collection.count_documents({}) > 0:
+        if self.collection.estimated_document_count() > 0:
             return False
         
         try:
+            now = datetime.utcnow()
+            
             # Basic plan
             basic = {
                 "name": "Basic",
@@ -205,8 +326,8 @@ class SubscriptionPlan:
                     "maxVillages": 2,
                     "maxTasks": 1
                 },
-                "createdAt": datetime.utcnow(),
-                "updatedAt": datetime.utcnow()
+                "createdAt": now,
+                "updatedAt": now
             }
             
             # Standard plan
@@ -224,8 +345,8 @@ class SubscriptionPlan:
                     "maxVillages": 5,
                     "maxTasks": 2
                 },
-                "createdAt": datetime.utcnow(),
-                "updatedAt": datetime.utcnow()
+                "createdAt": now,
+                "updatedAt": now
             }
             
             # Premium plan
@@ -243,11 +364,12 @@ class SubscriptionPlan:
                     "maxVillages": 15,
                     "maxTasks": 5
                 },
-                "createdAt": datetime.utcnow(),
-                "updatedAt": datetime.utcnow()
+                "createdAt": now,
+                "updatedAt": now
             }
             
             self.collection.insert_many([basic, standard, premium])
+            _plan_cache.delete(_PLAN_LIST_KEY)
             return True
         except Exception as e:
             print(f"Error creating default plans: {e}")
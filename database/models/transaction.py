@@ -5,7 +5,7 @@ This module handles subscription transactions with improved error handling.
 import logging
 from datetime import datetime
 from bson import ObjectId
-from pymongo import DESCENDING
+from pymongo import DESCENDING, ReturnDocument
 
 from database.mongodb import MongoDB
 
@@ -28,7 +28,8 @@ class Transaction:
         if db is not None:
             self.collection = db["transactions"]
     
-    def create_transaction(self, user_id, plan_id, amount, payment_method, payment_id, billing_period):
+    def create_transaction(self, user_id, plan_id, amount, payment_method, payment_id, billing_period,
+                           user=None, plan=None):
         """
         Create a new transaction record.
         
@@ -39,6 +40,9 @@ class Transaction:
             payment_method (str): Payment method (paypal, credit_card, etc.)
             payment_id (str): Payment ID from payment gateway
             billing_period (str): Billing period (monthly, yearly)
+            user (dict, optional): User document; its username and email are copied
+                onto the transaction so listings need no join
+            plan (dict, optional): Plan document; its name is copied likewise
         
         Returns:
             str: Transaction ID if successful, None otherwise
@@ -61,6 +65,12 @@ class Transaction:
                 'updatedAt': datetime.utcnow()
             }
             
+            # Denormalized display fields (kept in sync by refresh_plan_name)
+            if user:
+                transaction['userDenorm'] = {'username': user.get('username'), 'email': user.get('email')}
+            if plan:
+                transaction['planDenorm'] = {'name': plan.get('name')}
+            
             # Insert transaction
             result = self.collection.insert_one(transaction)
             
@@ -74,12 +84,13 @@ class Transaction:
             logger.error(f"Error creating transaction: {e}")
             return None
     
-    def get_transaction(self, transaction_id):
+    def get_transaction(self, transaction_id, projection=None):
         """
         Get transaction details.
         
         Args:
             transaction_id (str): Transaction ID
+            projection (dict, optional): Fields to return; full document if None
         
         Returns:
             dict: Transaction details or None if not found
@@ -90,7 +101,7 @@ class Transaction:
                 return None
                 
             # Get transaction
-            transaction = self.collection.find_one({'_id': ObjectId(transaction_id)})
+            transaction = self.collection.find_one({'_id': ObjectId(transaction_id)}, projection)
             
             if not transaction:
                 logger.warning(f"No transaction found with ID: {transaction_id}")
@@ -100,6 +111,81 @@ class Transaction:
             logger.error(f"Error getting transaction: {e}")
             return None
     
+    def refresh_plan_name(self, plan_id, plan_name):
+        """
+        Update the denormalized plan name on all transactions for a plan.
+        
+        Args:
+            plan_id (str): Subscription plan ID
+            plan_name (str): New plan name
+        
+        Returns:
+            int: Number of transactions updated
+        """
+        try:
+            if self.collection is None:
+                logger.error("Database connection not available")
+                return 0
+            
+            result = self.collection.update_many(
+                {'planId': ObjectId(plan_id), 'planDenorm': {'$exists': True}},
+                {'$set': {'planDenorm.name': plan_name}}
+            )
+            
+            return result.modified_count
+        except Exception as e:
+            logger.error(f"Error refreshing plan name on transactions: {e}")
+            return 0
+    
+    def backfill_denormalized_fields(self):
+        """
+        Copy user and plan display fields onto transactions created before
+        they were denormalized. Runs entirely server-side via $merge.
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            if self.collection is None:
+                logger.error("Database connection not available")
+                return False
+            
+            self.collection.aggregate([
+                {"$match": {"userDenorm": {"$exists": False}}},
+                {"$lookup": {
+                    "from": "users",
+                    # userId is stored as a string; convert so it can match users._id
+                    "let": {"uid": {"$convert": {
+                        "input": "$userId", "to": "objectId", "onError": None, "onNull": None
+                    }}},
+                    "pipeline": [
+                        {"$match": {"$expr": {"$eq": ["$_id", "$$uid"]}}},
+                        {"$project": {"username": 1, "email": 1}}
+                    ],
+                    "as": "user"
+                }},
+                {"$lookup": {
+                    "from": "subscriptionPlans",
+                    "localField": "planId",
+                    "foreignField": "_id",
+                    "pipeline": [{"$project": {"name": 1}}],
+                    "as": "plan"
+                }},
+                {"$project": {
+                    "userDenorm": {
+                        "username": {"$arrayElemAt": ["$user.username", 0]},
+                        "email": {"$arrayElemAt": ["$user.email", 0]}
+                    },
+                    "planDenorm": {"name": {"$arrayElemAt": ["$plan.name", 0]}}
+                }},
+                {"$merge": {"into": "transactions", "on": "_id", "whenMatched": "merge", "whenNotMatched": "discard"}}
+            ])
+            
+            return True
+        except Exception as e:
+            logger.error(f"Error backfilling denormalized transaction fields: {e}")
+            return False
+    
     def get_transaction_by_payment_id(self, payment_id):
         """
         Get transaction by payment ID.
@@ -168,7 +254,35 @@ class Transaction:
             logger.error(f"Error updating transaction status: {e}")
             return False
     
-    def get_user_transactions(self, user_id, status=None, limit=None):
+    def change_transaction_status(self, transaction_id, status, projection=None):
+        """
+        Set a transaction's status unless it already has it, in one operation.
+        
+        Args:
+            transaction_id (str): Transaction ID
+            status (str): New status (pending, completed, failed, refunded)
+            projection (dict, optional): Fields to return from the previous document
+        
+        Returns:
+            dict: The transaction as it was before the change, or None if it was
+            not found or already had this status
+        """
+        try:
+            if self.collection is None:
+                logger.error("Database connection not available")
+                return None
+            
+            return self.collection.find_one_and_update(
+                {'_id': ObjectId(transaction_id), 'status': {'$ne': status}},
+                {'$set': {'status': status, 'updatedAt': datetime.utcnow()}},
+                projection=projection,
+                return_document=ReturnDocument.BEFORE
+            )
+        except Exception as e:
+            logger.error(f"Error changing transaction status: {e}")
+            return None
+    
+    def get_user_transactions(self, user_id, status=None, limit=None, projection=None):
         """
         Get transactions for a user.
         
@@ -176,6 +290,7 @@ class Transaction:
             user_id (str): User ID
             status (str, optional): Filter by status
             limit (int, optional): Maximum number of transactions to return
+            projection (dict, optional): Fields to return (all fields if omitted)
         
         Returns:
             list: List of transactions
@@ -193,7 +308,7 @@ class Transaction:
                 query['status'] = status
             
             # Create cursor with sorting
-            cursor = self.collection.find(query).sort('createdAt', DESCENDING)
+            cursor = self.collection.find(query, projection).sort('createdAt', DESCENDING)
             
             # Apply limit if provided
             if limit:
@@ -6,6 +6,8 @@ import uuid
 import logging
 from datetime import datetime, timedelta
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
 from database.mongodb import MongoDB
 from passlib.hash import pbkdf2_sha256
 
@@ -16,6 +18,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger('database.models.user')
 
+# Collections holding per-user documents (keyed by userId) removed with the user
+USER_OWNED_COLLECTIONS = ('activity_logs', 'auto_farm_configurations', 'trainer_configurations')
+
 class User:
     """User model for Travian Whispers application."""
     
@@ -148,12 +153,13 @@ class User:
         
         return None
     
-    def get_user_by_id(self, user_id):
+    def get_user_by_id(self, user_id, projection=None):
         """
         Get a user by ID.
         
         Args:
             user_id (str): User ID
+            projection (dict, optional): Fields to return; full document if None
             
         Returns:
             dict: User document or None if not found
@@ -162,7 +168,7 @@ class User:
             return None
             
         try:
-            return self.collection.find_one({"_id": ObjectId(user_id)})
+            return self.collection.find_one({"_id": ObjectId(user_id)}, projection)
         except Exception as e:
             logger.error(f"Error getting user by ID: {e}")
             return None
@@ -375,6 +381,67 @@ class User:
             logger.error(f"Error updating villages: {e}")
             return False
     
+    def add_village(self, user_id, village):
+        """
+        Append a village to a user's list unless one with the same newdid exists.
+        
+        The duplicate check is part of the update filter, so concurrent
+        requests cannot both add the same village.
+        
+        Args:
+            user_id (str): User ID
+            village (dict): Village data
+            
+        Returns:
+            bool: True if added, False if it already exists or the update failed
+        """
+        if self.collection is None:
+            logger.error("Database not connected")
+            return False
+            
+        try:
+            result = self.collection.update_one(
+                {"_id": ObjectId(user_id), "villages.newdid": {"$ne": village["newdid"]}},
+                {
+                    "$push": {"villages": village},
+                    "$set": {"updatedAt": datetime.utcnow()}
+                }
+            )
+            
+            return result.modified_count > 0
+        except Exception as e:
+            logger.error(f"Error adding village: {e}")
+            return False
+    
+    def remove_village(self, user_id, newdid):
+        """
+        Remove a village from a user's list.
+        
+        Args:
+            user_id (str): User ID
+            newdid: Travian village ID, as stored on the village
+            
+        Returns:
+            bool: True if removed, False otherwise
+        """
+        if self.collection is None:
+            logger.error("Database not connected")
+            return False
+            
+        try:
+            result = self.collection.update_one(
+                {"_id": ObjectId(user_id)},
+                {
+                    "$pull": {"villages": {"newdid": newdid}},
+                    "$set": {"updatedAt": datetime.utcnow()}
+                }
+            )
+            
+            return result.modified_count > 0
+        except Exception as e:
+            logger.error(f"Error removing village: {e}")
+            return False
+    
     def merge_villages(self, user_id, new_villages):
         """
         Merge new villages with existing ones, preserving settings.
@@ -454,13 +521,8 @@ class User:
                 logger.error(f"Invalid subscription status: {status}")
                 return False
             
-            # Get current user data to preserve other subscription fields
-            user = self.get_user_by_id(user_id)
-            if not user:
-                logger.error(f"User not found: {user_id}")
-                return False
-            
-            # Update subscription status
+            # Update subscription status (a dotted $set leaves the other
+            # subscription fields untouched)
             subscription_data = {
                 'subscription.status': status,
                 'updatedAt': datetime.utcnow()
@@ -471,6 +533,10 @@ class User:
                 {'$set': subscription_data}
             )
             
+            if result.matched_count == 0:
+                logger.error(f"User not found: {user_id}")
+                return False
+            
             if result.modified_count > 0:
                 logger.info(f"Updated subscription status to {status} for user {user_id}")
                 return True
@@ -481,22 +547,137 @@ class User:
             logger.error(f"Error updating subscription status: {e}")
             return False
             
+    def activate_subscription(self, user_id, plan, start_date, end_date, billing_period):
+        """
+        Activate a plan for a user and switch their settings to the plan's features.
+        
+        Subscription and settings are written with dotted paths in one atomic
+        update, so payment history and other settings are left as they are. The
+        update only matches users without an active subscription, so concurrent
+        requests cannot activate a plan twice or replace an active one.
+        
+        Args:
+            user_id (str): User ID
+            plan (dict): Subscription plan document
+            start_date (datetime): Subscription start date
+            end_date (datetime): Subscription end date
+            billing_period (str): Billing period ('monthly' or 'yearly')
+            
+        Returns:
+            dict: The user's updated subscription and settings, or None if the
+            user was not found, already had an active subscription, or the
+            update failed
+        """
+        try:
+            if self.collection is None:
+                logger.error("Database connection not available")
+                return None
+            
+            features = plan['features']
+            update = {
+                'subscription.planId': plan['_id'],
+                'subscription.status': 'active',
+                'subscription.startDate': start_date,
+                'subscription.endDate': end_date,
+                'subscription.billingPeriod': billing_period,
+                'settings.autoFarm': bool(features.get('autoFarm')),
+                'settings.trainer': bool(features.get('trainer')),
+                'updatedAt': datetime.utcnow()
+            }
+            if features.get('notification'):
+                update['settings.notification'] = True
+            
+            return self.collection.find_one_and_update(
+                {'_id': ObjectId(user_id), 'subscription.status': {'$ne': 'active'}},
+                {'$set': update},
+                projection={'subscription': 1, 'settings': 1},
+                return_document=ReturnDocument.AFTER
+            )
+        except Exception as e:
+            logger.error(f"Error activating subscription: {e}")
+            return None
+    
+    def bulk_update_subscription_status(self, user_ids, status):
+        """
+        Update the subscription status of many users in a single round trip.
+        
+        Args:
+            user_ids (list): User IDs
+            status (str): New subscription status ('active', 'inactive', 'cancelled', 'expired')
+            
+        Returns:
+            int: Number of users updated
+        """
+        try:
+            if self.collection is None:
+                logger.error("Database connection not available")
+                return 0
+            
+            # 'expired' is only ever set in bulk, by the expiry sweep
+            if status not in ['active', 'inactive', 'cancelled', 'expired']:
+                logger.error(f"Invalid subscription status: {status}")
+                return 0
+            
+            if not user_ids:
+                return 0
+            
+            result = self.collection.update_many(
+                {'_id': {'$in': [ObjectId(user_id) for user_id in user_ids]}},
+                {'$set': {
+                    'subscription.status': status,
+                    'updatedAt': datetime.utcnow()
+                }}
+            )
+            
+            logger.info(f"Updated subscription status to {status} for {result.modified_count} users")
+            return result.modified_count
+        except Exception as e:
+            logger.error(f"Error bulk updating subscription status: {e}")
+            return 0
+    
     def cancel_subscription(self, user_id):
         """
-        Cancel a user's subscription.
+        Cancel a user's subscription if it is active.
+        
+        The status check is part of the update filter, so no read is needed
+        and a concurrent change of status cannot be overwritten.
         
         Args:
             user_id (str): User ID
             
         Returns:
-            bool: True if successful, False otherwise
+            bool: True if an active subscription was cancelled, False otherwise
         """
-        return self.update_subscription_status(user_id, 'cancelled')
+        try:
+            if self.collection is None:
+                logger.error("Database connection not available")
+                return False
+            
+            result = self.collection.update_one(
+                {'_id': ObjectId(user_id), 'subscription.status': 'active'},
+                {'$set': {
+                    'subscription.status': 'cancelled',
+                    'updatedAt': datetime.utcnow()
+                }}
+            )
+            
+            if result.modified_count > 0:
+                logger.info(f"Cancelled subscription for user {user_id}")
+                return True
+            return False
+        except Exception as e:
+            logger.error(f"Error cancelling subscription: {e}")
+            return False
         
     def delete_user(self, user_id):
         """
         Delete a user and all associated data.
         
+        The user, their activity logs and their automation configurations are
+        removed in one transaction where the deployment supports it (replica set
+        or sharded cluster); a standalone server deletes them one after the
+        other instead. Payment transactions are kept as financial records.
+        
         Args:
             user_id (str): User ID
             
@@ -506,18 +687,27 @@ class User:
         if self.collection is None:
             logger.error("Database not connected")
             return False
+        
+        def delete_all(session=None):
+            result = self.collection.delete_one({"_id": ObjectId(user_id)}, session=session)
+            if result.deleted_count > 0:
+                # Dependent collections store the user ID as a string
+                for collection_name in USER_OWNED_COLLECTIONS:
+                    self.db[collection_name].delete_many({"userId": str(user_id)}, session=session)
+            return result.deleted_count > 0
             
         try:
-            # Delete user
-            result = self.collection.delete_one({"_id": ObjectId(user_id)})
-            
-            if result.deleted_count > 0:
+            try:
+                with MongoDB().get_client().start_session() as session:
+                    deleted = session.with_transaction(delete_all)
+            except OperationFailure as e:
+                # IllegalOperation: transactions need a replica set or mongos
+                if e.code != 20:
+                    raise
+                deleted = delete_all()
+            
+            if deleted:
                 logger.info(f"Deleted user {user_id}")
-                
-                # Clear associated data
-                # Note: In a real implementation, you would also delete associated data
-                # from other collections
-                
                 return True
             else:
                 logger.warning(f"Failed to delete user {user_id}")
@@ -20,6 +20,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger('mongodb')
 
+# Collation for case-insensitive equality matches that can still use an index
+CASE_INSENSITIVE_COLLATION = {"locale": "en", "strength": 2}
+
 class MongoDB:
     """MongoDB connection handler for Travian Whispers."""
     
@@ -54,14 +57,16 @@ class MongoDB:
             db_name = config.MONGODB_DB_NAME
         
         try:
-            # Use a connection pool for better performance
+            # Use a connection pool for better performance (sized in config.py)
             self.client = MongoClient(
                 connection_string, 
-                serverSelectionTimeoutMS=5000,
+                serverSelectionTimeoutMS=config.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
                 connectTimeoutMS=10000,
                 socketTimeoutMS=45000,
-                maxPoolSize=50,
-                waitQueueTimeoutMS=2500,
+                maxPoolSize=config.MONGODB_MAX_POOL_SIZE,
+                # Keep warm sockets so request bursts skip TCP/TLS handshakes
+                minPoolSize=config.MONGODB_MIN_POOL_SIZE,
+                waitQueueTimeoutMS=config.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
                 retryWrites=True,
                 retryReads=True,
                 tz_aware=True
@@ -95,6 +100,17 @@ class MongoDB:
                 return None
         return self.db
     
+    def get_client(self):
+        """
+        Get the shared MongoClient (and its connection pool).
+        
+        Returns:
+            pymongo.MongoClient: Client instance or None if not connected
+        """
+        if self.get_db() is None:
+            return None
+        return self.client
+    
     def get_collection(self, collection_name):
         """
         Get a collection by name.
@@ -129,22 +145,33 @@ class MongoDB:
             # User collection indexes
             db.users.create_index([("username", pymongo.ASCENDING)], unique=True)
             db.users.create_index([("email", pymongo.ASCENDING)], unique=True)
+            # Case-insensitive copies for admin user search (named to coexist with the unique ones)
+            db.users.create_index([("username", pymongo.ASCENDING)], name="username_ci", collation=CASE_INSENSITIVE_COLLATION)
+            db.users.create_index([("email", pymongo.ASCENDING)], name="email_ci", collation=CASE_INSENSITIVE_COLLATION)
             db.users.create_index([("verificationToken", pymongo.ASCENDING)])
             db.users.create_index([("resetPasswordToken", pymongo.ASCENDING)])
             db.users.create_index([("subscription.status", pymongo.ASCENDING)])
             db.users.create_index([("subscription.endDate", pymongo.ASCENDING)])
+            # Subscribers per plan (plan user counts, joins from subscriptionPlans)
+            db.users.create_index([("subscription.planId", pymongo.ASCENDING)])
             
             # Subscription plans indexes
             db.subscriptionPlans.create_index([("name", pymongo.ASCENDING)], unique=True)
             
             # Transactions indexes
-            db.transactions.create_index([("userId", pymongo.ASCENDING)])
+            # Compound indexes serve filtered lists sorted newest-first without an
+            # in-memory sort; their leading fields also cover plain userId/status lookups
+            db.transactions.create_index([("userId", pymongo.ASCENDING), ("createdAt", pymongo.DESCENDING)])
+            db.transactions.create_index([("status", pymongo.ASCENDING), ("createdAt", pymongo.DESCENDING)])
+            db.transactions.create_index([("planId", pymongo.ASCENDING), ("createdAt", pymongo.DESCENDING)])
             db.transactions.create_index([("paymentId", pymongo.ASCENDING)], unique=True)
-            db.transactions.create_index([("createdAt", pymongo.DESCENDING)])
-            db.transactions.create_index([("status", pymongo.ASCENDING)])
+            # Newest-first listing and keyset pagination (createdAt, _id)
+            db.transactions.create_index([("createdAt", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)])
+            db.transactions.create_index([("updatedAt", pymongo.DESCENDING)])
             
             # Activity logs indexes
-            db.activity_logs.create_index([("userId", pymongo.ASCENDING)])
+            # A user's logs newest-first; the leading userId also serves delete_user_logs
+            db.activity_logs.create_index([("userId", pymongo.ASCENDING), ("timestamp", pymongo.DESCENDING)])
             db.activity_logs.create_index([("timestamp", pymongo.DESCENDING)])
             db.activity_logs.create_index([("activityType", pymongo.ASCENDING)])
             
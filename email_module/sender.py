@@ -84,4 +84,11 @@ def send_welcome_email(to_email, username):
     Mock function for welcome email.
     """
     logger.info(f"[MOCK WELCOME] To: {to_email}, Username: {username}")
+    return True
+
+def send_subscription_expiry_email(to_email, username):
+    """
+    Mock function for subscription expiry email.
+    """
+    logger.info(f"[MOCK SUBSCRIPTION EXPIRY] To: {to_email}, Username: {username}")
     return True
\ No newline at end of file
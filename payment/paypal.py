@@ -5,13 +5,33 @@ This module provides improved functions for creating and processing PayPal payme
 import logging
 import json
 import re
+import time
+from urllib.parse import urlparse
 from datetime import datetime, timedelta
+import msgspec
 from bson import ObjectId
+from cachelib import SimpleCache
+from pymongo.errors import DuplicateKeyError
 from payment.http_utils import perform_request, basic_auth_header
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
+# OAuth access tokens are reused until shortly before PayPal expires them, so
+# order creation and webhook verification make one API call instead of two
+TOKEN_EXPIRY_MARGIN = 60
+_token_cache = SimpleCache(threshold=8)
+
+# Order processing records: a claim still 'processing' after ORDER_CLAIM_TIMEOUT
+# belongs to a run that died and may be retried; a replay that finds a live
+# claim waits up to ORDER_WAIT_SECONDS for it to finish
+ORDER_CLAIMED = 'claimed'
+ORDER_PROCESSING = 'processing'
+ORDER_DONE = 'done'
+ORDER_CLAIM_TIMEOUT = timedelta(minutes=5)
+ORDER_WAIT_SECONDS = 10
+ORDER_POLL_INTERVAL = 0.5
+
 def get_paypal_config():
     """
     Get PayPal configuration from environment.
@@ -35,13 +55,19 @@ def get_paypal_config():
 
 def get_access_token():
     """
-    Get PayPal API access token.
+    Get PayPal API access token, reusing a cached one while it is valid.
     
     Returns:
         str: Access token or None if failed
     """
     paypal_config = get_paypal_config()
     
+    # Keyed by client and environment so a config change never reuses a token
+    cache_key = f"{paypal_config['client_id']}:{paypal_config['base_url']}"
+    token = _token_cache.get(cache_key)
+    if token:
+        return token
+    
     try:
         url = f"{paypal_config['base_url']}/v1/oauth2/token"
         headers = {
@@ -64,6 +90,9 @@ def get_access_token():
             
             if token:
                 logger.debug("Successfully obtained PayPal access token")
+                expires_in = int(response_data.get("expires_in", 0)) - TOKEN_EXPIRY_MARGIN
+                if expires_in > 0:
+                    _token_cache.set(cache_key, token, timeout=expires_in)
                 return token
             else:
                 logger.error("PayPal response missing access_token field")
@@ -98,21 +127,16 @@ def create_subscription_order(plan_id, user_id, success_url, cancel_url, billing
     Returns:
         tuple: (success, order_id, approval_url)
     """
-    from database.models.subscription import SubscriptionPlan
-    from database.models.user import User
-    from database.models.transaction import Transaction
-    from database.models.activity_log import ActivityLog
+    from database.models import user_model, plan_model, activity_model, transaction_model
     
     # Get subscription plan
-    plan_model = SubscriptionPlan()
-    plan = plan_model.get_plan_by_id(plan_id)
+    plan = plan_model.get_plan_by_id_cached(plan_id)
     
     if not plan:
         logger.error(f"Subscription plan not found: {plan_id}")
         return False, None, None
     
     # Get user
-    user_model = User()
     user = user_model.get_user_by_id(user_id)
     
     if not user:
@@ -202,14 +226,15 @@ def create_subscription_order(plan_id, user_id, success_url, cancel_url, billing
                     return False, None, None
                 
                 # Create transaction record
-                transaction_model = Transaction()
                 transaction_id = transaction_model.create_transaction(
                     user_id=user_id,
                     plan_id=plan_id,
                     amount=float(price),
                     payment_method="paypal",
                     payment_id=order_id,
-                    billing_period=billing_period
+                    billing_period=billing_period,
+                    user=user,
+                    plan=plan
                 )
                 
                 if not transaction_id:
@@ -218,7 +243,6 @@ def create_subscription_order(plan_id, user_id, success_url, cancel_url, billing
                 
                 # Log transaction creation
                 try:
-                    activity_model = ActivityLog()
                     activity_model.log_activity(
                         user_id=user_id,
                         activity_type='payment-initiated',
@@ -266,26 +290,167 @@ def create_subscription_order(plan_id, user_id, success_url, cancel_url, billing
         logger.error(f"Error creating PayPal order: {e}", exc_info=True)
         return False, None, None
 
-def process_successful_payment(order_id):
+def claim_order(order_id, reclaim_done=False):
+    """
+    Claim an order for processing, unless another run holds or finished it.
+    
+    The order ID is the record's _id, so each step is a single unique index
+    hit. A processing claim older than ORDER_CLAIM_TIMEOUT belongs to a run
+    that died, so it may be taken over.
+    
+    Args:
+        order_id (str): PayPal order ID
+        reclaim_done (bool): Also take over an order that was already done
+        
+    Returns:
+        str: ORDER_CLAIMED if this caller claimed the order, otherwise the
+            state of the existing record (ORDER_PROCESSING or ORDER_DONE)
+    """
+    from database.mongodb import MongoDB
+    
+    db = MongoDB().get_db()
+    if db is None:
+        raise RuntimeError("Database not connected")
+    
+    now = datetime.utcnow()
+    
+    try:
+        db.paypal_processed.insert_one({'_id': order_id, 'state': ORDER_PROCESSING, 'ts': now})
+        return ORDER_CLAIMED
+    except DuplicateKeyError:
+        pass
+    
+    takeover = [{'state': ORDER_PROCESSING, 'ts': {'$lt': now - ORDER_CLAIM_TIMEOUT}}]
+    if reclaim_done:
+        takeover.append({'state': {'$ne': ORDER_PROCESSING}})
+    
+    result = db.paypal_processed.update_one(
+        {'_id': order_id, '$or': takeover},
+        {'$set': {'state': ORDER_PROCESSING, 'ts': now}}
+    )
+    if result.modified_count:
+        return ORDER_CLAIMED
+    
+    record = db.paypal_processed.find_one({'_id': order_id}, {'state': 1})
+    if record is None:
+        # Released between the insert and the update; let the caller retry
+        return ORDER_PROCESSING
+    
+    # Records written before states were tracked only exist for finished orders
+    return record.get('state', ORDER_DONE)
+
+def finish_order(order_id):
+    """
+    Mark a claimed order as done once its payment has been fully processed.
+    
+    Args:
+        order_id (str): PayPal order ID
+    """
+    from database.mongodb import MongoDB
+    
+    db = MongoDB().get_db()
+    if db is not None:
+        db.paypal_processed.update_one(
+            {'_id': order_id},
+            {'$set': {'state': ORDER_DONE, 'ts': datetime.utcnow()}}
+        )
+
+def release_order(order_id):
+    """
+    Remove an order's processing record so a failed payment can be retried.
+    
+    Args:
+        order_id (str): PayPal order ID
+    """
+    from database.mongodb import MongoDB
+    
+    db = MongoDB().get_db()
+    if db is not None:
+        db.paypal_processed.delete_one({'_id': order_id, 'state': ORDER_PROCESSING})
+
+def _wait_for_order(order_id):
+    """
+    Wait briefly for another run to finish processing an order.
+    
+    Args:
+        order_id (str): PayPal order ID
+        
+    Returns:
+        bool: True if the order was done within ORDER_WAIT_SECONDS
+    """
+    from database.mongodb import MongoDB
+    
+    deadline = time.monotonic() + ORDER_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(ORDER_POLL_INTERVAL)
+        
+        db = MongoDB().get_db()
+        record = db.paypal_processed.find_one({'_id': order_id}, {'state': 1}) if db is not None else None
+        if record is None:
+            # The other run failed and released its claim
+            return False
+        if record.get('state', ORDER_DONE) == ORDER_DONE:
+            return True
+    
+    return False
+
+def process_successful_payment(order_id, reprocess=False):
     """
     Process a successful payment and update user subscription.
     
+    Replays of an order (webhook and return callback racing, repeated
+    callbacks) are answered from the processing record without redoing the work.
+    
     Args:
         order_id (str): PayPal order ID
+        reprocess (bool): Process the order even if it was done before, for
+            an admin completing a transaction again
         
     Returns:
         bool: True if successful, False otherwise
     """
     try:
-        from database.models.user import User
-        from database.models.subscription import SubscriptionPlan
-        from database.models.transaction import Transaction
-        from database.models.activity_log import ActivityLog
+        state = claim_order(order_id, reclaim_done=reprocess)
+    except Exception as e:
+        logger.error(f"Error recording order {order_id}: {e}")
+        return False
+    
+    if state == ORDER_DONE:
+        logger.info(f"Order {order_id} already processed")
+        return True
+    
+    if state == ORDER_PROCESSING:
+        logger.info(f"Order {order_id} is being processed by another request; waiting for it")
+        return _wait_for_order(order_id)
+    
+    success = _process_payment(order_id)
+    
+    try:
+        if success:
+            finish_order(order_id)
+        else:
+            release_order(order_id)
+    except Exception as e:
+        logger.error(f"Error updating processing record for order {order_id}: {e}")
+    
+    return success
+
+def _process_payment(order_id):
+    """
+    Complete an order's transaction and activate the user's subscription.
+    
+    Args:
+        order_id (str): PayPal order ID
+        
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    try:
+        from database.models import user_model, plan_model, activity_model, transaction_model
         
         logger.info(f"Processing payment for order ID: {order_id}")
         
         # Get transaction details
-        transaction_model = Transaction()
         transaction = transaction_model.get_transaction_by_payment_id(order_id)
         
         if not transaction:
@@ -310,11 +475,8 @@ def process_successful_payment(order_id):
         logger.info(f"Transaction status updated to completed for {transaction_id}")
         
         # Get user and plan details
-        user_model = User()
-        plan_model = SubscriptionPlan()
-        
         user = user_model.get_user_by_id(transaction['userId'])
-        plan = plan_model.get_plan_by_id(str(transaction['planId']))
+        plan = plan_model.get_plan_by_id_cached(str(transaction['planId']))
         
         if not user or not plan:
             logger.error(f"User or plan not found: user_id={transaction['userId']}, plan_id={transaction['planId']}")
@@ -407,7 +569,6 @@ def process_successful_payment(order_id):
         
         # Log activity
         try:
-            activity_model = ActivityLog()
             activity_model.log_activity(
                 user_id=transaction['userId'],
                 activity_type='subscription-activated',
@@ -432,6 +593,60 @@ def process_successful_payment(order_id):
         logger.error(f"Error processing payment: {str(e)}", exc_info=True)
         return False
 
+# Headers PayPal sends with every webhook for signature verification
+WEBHOOK_SIGNATURE_HEADERS = (
+    'PAYPAL-AUTH-ALGO',
+    'PAYPAL-CERT-URL',
+    'PAYPAL-TRANSMISSION-ID',
+    'PAYPAL-TRANSMISSION-SIG',
+    'PAYPAL-TRANSMISSION-TIME'
+)
+
+def precheck_webhook_headers(headers):
+    """
+    Run the cheap local checks on webhook headers, without calling PayPal.
+    
+    Passing this does not authenticate a webhook; verify_webhook_signature does.
+    
+    Args:
+        headers (dict): Request headers
+        
+    Returns:
+        bool: False if the headers are certainly not from PayPal, True otherwise
+    """
+    # Without a webhook ID verification is skipped entirely (development)
+    if not get_paypal_config().get('webhook_id'):
+        return True
+    
+    if not all(headers.get(name) for name in WEBHOOK_SIGNATURE_HEADERS):
+        logger.error("Missing required PayPal webhook headers")
+        return False
+    
+    # The signing certificate must be served by PayPal over HTTPS
+    cert_url = urlparse(headers.get('PAYPAL-CERT-URL'))
+    host = cert_url.hostname or ''
+    if cert_url.scheme != 'https' or not (host == 'paypal.com' or host.endswith('.paypal.com')):
+        logger.error(f"Untrusted PayPal webhook certificate URL: {headers.get('PAYPAL-CERT-URL')}")
+        return False
+    
+    return True
+
+def build_webhook_verification_payload(webhook_body, fields):
+    """
+    Build the body for PayPal's verify-webhook-signature call.
+    
+    The event is embedded as the raw body instead of being parsed and
+    re-serialized, which also keeps it byte-for-byte what PayPal signed.
+    
+    Args:
+        webhook_body (bytes): Raw webhook body
+        fields (dict): Transmission headers and webhook ID
+        
+    Returns:
+        bytes: JSON request body
+    """
+    return msgspec.json.encode({**fields, "webhook_event": msgspec.Raw(webhook_body)})
+
 def verify_webhook_signature(webhook_body, headers):
     """
     Verify PayPal webhook signature.
@@ -471,16 +686,14 @@ def verify_webhook_signature(webhook_body, headers):
             logger.error("Failed to get access token for webhook verification")
             return False
         
-        # Build verification payload
-        verification_payload = {
+        verification_payload = build_webhook_verification_payload(webhook_body, {
             "auth_algo": auth_algo,
             "cert_url": cert_url,
             "transmission_id": transmission_id,
             "transmission_sig": transmission_sig,
             "transmission_time": transmission_time,
-            "webhook_id": webhook_id,
-            "webhook_event": json.loads(webhook_body.decode('utf-8'))
-        }
+            "webhook_id": webhook_id
+        })
         
         # Make verification request
         paypal_config = get_paypal_config()
@@ -494,7 +707,7 @@ def verify_webhook_signature(webhook_body, headers):
             url,
             method="POST",
             headers=headers,
-            data=json.dumps(verification_payload)
+            data=verification_payload
         )
         
         if status == 200:
@@ -564,14 +777,13 @@ def handle_webhook_event(event_type, event_data):
                 
         elif event_type == "PAYMENT.CAPTURE.DENIED":
             # Handle denied payment
-            from database.models.transaction import Transaction
+            from database.models import transaction_model
             
             resource = event_data.get("resource", {})
             payment_id = resource.get("id")
             
             if payment_id:
                 # Update transaction status to 'failed'
-                transaction_model = Transaction()
                 transaction = transaction_model.get_transaction_by_payment_id(payment_id)
                 
                 if transaction:
@@ -586,22 +798,19 @@ def handle_webhook_event(event_type, event_data):
                 
         elif event_type == "PAYMENT.CAPTURE.REFUNDED":
             # Handle refunded payment
-            from database.models.transaction import Transaction
-            from database.models.user import User
+            from database.models import user_model, transaction_model
             
             resource = event_data.get("resource", {})
             payment_id = resource.get("id")
             
             if payment_id:
                 # Update transaction status to 'refunded'
-                transaction_model = Transaction()
                 transaction = transaction_model.get_transaction_by_payment_id(payment_id)
                 
                 if transaction:
                     transaction_model.update_transaction_status(str(transaction['_id']), 'refunded')
                     
                     # Cancel subscription
-                    user_model = User()
                     if hasattr(user_model, 'cancel_subscription'):
                         user_model.cancel_subscription(str(transaction['userId']))
                     else:
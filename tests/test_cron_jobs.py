@@ -0,0 +1,78 @@
+"""
+Tests for the cron jobs module and the batched subscription expiry.
+"""
+import importlib.util
+import os
+import py_compile
+import unittest
+from unittest import mock
+
+from bson import ObjectId
+
+CRON_JOBS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cron-jobs.py')
+
+
+def _has_modules(*names):
+    return all(importlib.util.find_spec(name) is not None for name in names)
+
+
+def _load_cron_jobs():
+    spec = importlib.util.spec_from_file_location('cron_jobs', CRON_JOBS_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class CronJobsModuleTest(unittest.TestCase):
+    def test_module_compiles(self):
+        py_compile.compile(CRON_JOBS_PATH, doraise=True)
+
+    @unittest.skipUnless(_has_modules('schedule', 'dotenv', 'passlib'), 'cron job dependencies not installed')
+    def test_expired_subscriptions_are_updated_in_one_call(self):
+        cron_jobs = _load_cron_jobs()
+        expired = [
+            {'_id': ObjectId(), 'email': 'a@example.com', 'username': 'a'},
+            {'_id': ObjectId(), 'email': 'b@example.com', 'username': 'b'},
+        ]
+        db = mock.Mock()
+        db.get_collection.return_value.find.return_value = expired
+
+        with mock.patch.object(cron_jobs, 'db', db), \
+                mock.patch.object(cron_jobs, 'User') as user_class, \
+                mock.patch.object(cron_jobs, 'send_subscription_expiry_email') as send_email:
+            user_class.return_value.bulk_update_subscription_status.return_value = 2
+            cron_jobs.check_expired_subscriptions()
+
+        user_class.return_value.bulk_update_subscription_status.assert_called_once_with(
+            [user['_id'] for user in expired], 'expired'
+        )
+        self.assertEqual(send_email.call_count, 2)
+
+
+@unittest.skipUnless(_has_modules('dotenv', 'passlib'), 'database dependencies not installed')
+class BulkUpdateSubscriptionStatusTest(unittest.TestCase):
+    def setUp(self):
+        from database.models.user import User
+
+        self.user_model = User.__new__(User)
+        self.user_model.collection = mock.Mock()
+        self.user_model.collection.update_many.return_value.modified_count = 2
+
+    def test_updates_all_users_in_one_query(self):
+        user_ids = [str(ObjectId()), str(ObjectId())]
+
+        count = self.user_model.bulk_update_subscription_status(user_ids, 'expired')
+
+        self.assertEqual(count, 2)
+        query, update = self.user_model.collection.update_many.call_args.args
+        self.assertEqual(query, {'_id': {'$in': [ObjectId(user_id) for user_id in user_ids]}})
+        self.assertEqual(update['$set']['subscription.status'], 'expired')
+
+    def test_skips_empty_and_invalid_requests(self):
+        self.assertEqual(self.user_model.bulk_update_subscription_status([], 'expired'), 0)
+        self.assertEqual(self.user_model.bulk_update_subscription_status([str(ObjectId())], 'bogus'), 0)
+        self.user_model.collection.update_many.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
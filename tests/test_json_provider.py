@@ -0,0 +1,55 @@
+"""
+Tests for the msgspec JSON provider.
+"""
+import unittest
+
+from flask import Flask, request
+
+from web.utils.json_provider import MsgspecJSONProvider
+
+
+def _create_app():
+    app = Flask(__name__)
+    app.json = MsgspecJSONProvider(app)
+
+    @app.route('/echo', methods=['POST'])
+    def echo():
+        return {'data': request.get_json()}
+
+    @app.route('/silent', methods=['POST'])
+    def silent():
+        return {'data': request.get_json(silent=True)}
+
+    return app
+
+
+class MsgspecJSONProviderTest(unittest.TestCase):
+    def setUp(self):
+        self.client = _create_app().test_client()
+
+    def test_valid_body_round_trips(self):
+        response = self.client.post('/echo', data='{"a": 1}', content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {'data': {'a': 1}})
+
+    def test_malformed_body_returns_400(self):
+        response = self.client.post('/echo', data='{bad', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_empty_body_returns_400(self):
+        response = self.client.post('/echo', data='', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_malformed_body_is_none_when_silent(self):
+        response = self.client.post('/silent', data='{bad', content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {'data': None})
+
+    def test_loads_raises_value_error(self):
+        provider = MsgspecJSONProvider(Flask(__name__))
+        with self.assertRaises(ValueError):
+            provider.loads('{bad')
+
+
+if __name__ == '__main__':
+    unittest.main()
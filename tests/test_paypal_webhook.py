@@ -0,0 +1,40 @@
+"""
+Tests for PayPal webhook signature verification helpers.
+"""
+import json
+import unittest
+
+from payment.paypal import build_webhook_verification_payload
+
+FIELDS = {
+    "auth_algo": "SHA256withRSA",
+    "cert_url": "https://api.paypal.com/v1/notifications/certs/CERT-360caa42",
+    "transmission_id": "69cd13f0-d67a-11e5-baa3-778b53f4ae55",
+    "transmission_sig": "lmI95Jx3Y9nhR5SJWlHVIWpg4AgFk7n9bCHSRxbrd8A9zrhdu2rMyFrmz+Zjh3s3boXB07VXCXUZy/UFzUlnGJn0wDugt7FlSvdKeIJenLRemUxYCPVoEZzg9VFNqOa48gMkvF+XTpxBeUx/kWy6B5cp7GkT2+pOowfRK7OaynuxUoKW3JcMWw272VKjLTtTAShncla7tGF+55rxyt2KNZIIqxNMJ48RDZheGU5w1npu9dZHnPgTXB9iomeVRoD8O/jhRpnKsGrDschyNdkeh81BJJMH4Ctc6lnCCquoP/GzCzz33MMsNdid7vL/NIWaCsekQpW26FpWPi/tfj8nLA==",
+    "transmission_time": "2016-02-18T20:01:35Z",
+    "webhook_id": "1JE4291016473214C",
+}
+
+
+class BuildWebhookVerificationPayloadTest(unittest.TestCase):
+    def test_round_trips_fields_and_event(self):
+        body = b'{"id":"WH-1","event_type":"PAYMENT.CAPTURE.COMPLETED","resource":{"id":"CAP-1","amount":{"value":"9.99"}}}'
+
+        payload = json.loads(build_webhook_verification_payload(body, FIELDS))
+
+        self.assertEqual(payload["webhook_event"], json.loads(body))
+        for key, value in FIELDS.items():
+            self.assertEqual(payload[key], value)
+
+    def test_embeds_event_bytes_unchanged(self):
+        # Whitespace and key order are part of what PayPal signed
+        body = b'{ "b": 1,\n  "a": [1.50, "\\u00e9"] }\n'
+
+        payload = build_webhook_verification_payload(body, FIELDS)
+
+        self.assertIn(body, payload)
+        self.assertEqual(json.loads(payload)["webhook_event"], {"b": 1, "a": [1.5, "é"]})
+
+
+if __name__ == '__main__':
+    unittest.main()
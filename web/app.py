@@ -3,18 +3,16 @@ Flask application factory update for Travian Whispers.
 This is an updated version of the application factory that includes maintenance mode support.
 """
 import os
-import json
-from flask import Flask, jsonify
+from flask import Flask
 from flask_cors import CORS
 from werkzeug.middleware.proxy_fix import ProxyFix
-from bson import ObjectId
-from datetime import datetime
 from web.routes.travian_api import register_routes as register_travian_api_routes
 from web.extensions import register_extensions
 from web.routes import register_blueprints
 from web.utils.error_handlers import register_error_handlers
 from web.utils.context_processors import register_context_processors
 from web.maintenance import register_maintenance_middleware
+from web.utils.json_provider import MsgspecJSONProvider
 
 def create_app(config_object=None):
     """
@@ -105,41 +103,10 @@ def configure_app(app, config_object=None):
 def configure_json_serialization(app):
     """
     Configure JSON serialization for the Flask application.
-    Uses a custom implementation to override Flask's default JSON serialization.
+    Installs a msgspec-backed JSON provider that also handles MongoDB ObjectId
+    and datetime values, so jsonify() needs no pre-serialization pass.
     
     Args:
         app: Flask application instance
     """
-    # Create custom JSON encoder function
-    def custom_json_encoder(obj):
-        if isinstance(obj, ObjectId):
-            return str(obj)
-        if isinstance(obj, datetime):
-            return obj.isoformat() if obj else None
-        raise TypeError(f"Type {type(obj)} not serializable")
-    
-    # Override Flask's jsonify to handle MongoDB ObjectId and datetime
-    original_jsonify = jsonify
-    
-    def custom_jsonify(*args, **kwargs):
-        if args and kwargs:
-            raise TypeError('jsonify() behavior undefined when passed both args and kwargs')
-        if len(args) == 1:
-            data = args[0]
-        else:
-            data = args or kwargs
-            
-        # First convert to JSON string using the custom encoder
-        dumped = json.dumps(data, default=custom_json_encoder)
-        # Then parse it back to ensure it's fully serializable
-        parsed = json.loads(dumped)
-        # Now use Flask's original jsonify with the serialized data
-        return original_jsonify(parsed)
-    
-    # Replace Flask's jsonify in the current module
-    import flask
-    flask.jsonify = custom_jsonify
-    
-    # Configure Flask JSON settings
-    app.config['JSONIFY_PRETTYPRINT_REGULAR'] = False
-    app.config['JSON_SORT_KEYS'] = False
\ No newline at end of file
+    app.json = MsgspecJSONProvider(app)
\ No newline at end of file
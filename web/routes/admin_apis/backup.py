@@ -12,9 +12,9 @@ from flask import (
 )
 
 from web.utils.decorators import admin_required
-from database.models.user import User
 from database.backup import create_backup, BackupError
 from database.models.backup import BackupRecord
+from database.models import user_model
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -34,7 +34,6 @@ def create_backup_route():
     Handles both form submissions and API requests.
     """
     # Get current user for logging
-    user_model = User()
     current_user = user_model.get_user_by_id(session['user_id'])
     
     # Get request data (supporting both JSON and form data)
@@ -141,7 +140,6 @@ def download_backup(filename):
     Download a backup file.
     """
     # Get current user for logging
-    user_model = User()
     current_user = user_model.get_user_by_id(session['user_id'])
     
     # Validate filename to prevent directory traversal
@@ -173,7 +171,6 @@ def delete_backup():
     Handles both form submissions and API requests.
     """
     # Get current user for logging
-    user_model = User()
     current_user = user_model.get_user_by_id(session['user_id'])
     
     # Get request data (supporting both JSON and form data)
@@ -293,7 +290,6 @@ def restore_backup():
     Currently just a placeholder as this would be complex to implement.
     """
     # Get current user for logging
-    user_model = User()
     current_user = user_model.get_user_by_id(session['user_id'])
     
     # Get backup filename
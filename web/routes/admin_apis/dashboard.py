@@ -10,9 +10,7 @@ from flask import (
 from bson import ObjectId
 
 from web.utils.decorators import admin_required
-from database.models.user import User
-from database.models.subscription import SubscriptionPlan
-from database.models.transaction import Transaction
+from database.models import user_model, plan_model, transaction_model
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -26,13 +24,8 @@ def register_routes(admin_bp):
 @admin_required
 def dashboard():
     """Admin dashboard route."""
-    # Initialize models
-    user_model = User()
-    subscription_model = SubscriptionPlan()
-    transaction_model = Transaction()
-    
-    # Calculate user statistics
-    total_users = user_model.collection.count_documents({})
+    # Calculate user statistics (unfiltered total comes from collection metadata)
+    total_users = user_model.collection.estimated_document_count()
     active_users = user_model.collection.count_documents({"subscription.status": "active"})
     
     # Get new users this week
@@ -43,33 +36,26 @@ def dashboard():
     current_month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
     previous_month_start = (current_month_start - timedelta(days=1)).replace(day=1)
     
-    # Get current month revenue
+    # Get current and previous month revenue in a single pass: match both months
+    # once, then split the sum on the month boundary server-side
     revenue_pipeline = [
         {"$match": {
-            "createdAt": {"$gte": current_month_start},
-            "status": "completed"
-        }},
-        {"$group": {
-            "_id": None,
-            "total": {"$sum": "$amount"}
-        }}
-    ]
-    current_revenue = list(transaction_model.collection.aggregate(revenue_pipeline))
-    monthly_revenue = current_revenue[0]["total"] if current_revenue else 0
-    
-    # Get previous month revenue for comparison
-    prev_revenue_pipeline = [
-        {"$match": {
-            "createdAt": {"$gte": previous_month_start, "$lt": current_month_start},
+            "createdAt": {"$gte": previous_month_start},
             "status": "completed"
         }},
         {"$group": {
             "_id": None,
-            "total": {"$sum": "$amount"}
+            "current": {"$sum": {
+                "$cond": [{"$gte": ["$createdAt", current_month_start]}, "$amount", 0]
+            }},
+            "previous": {"$sum": {
+                "$cond": [{"$lt": ["$createdAt", current_month_start]}, "$amount", 0]
+            }}
         }}
     ]
-    prev_revenue = list(transaction_model.collection.aggregate(prev_revenue_pipeline))
-    prev_monthly_revenue = prev_revenue[0]["total"] if prev_revenue else 0
+    revenue = next(transaction_model.collection.aggregate(revenue_pipeline), None)
+    monthly_revenue = revenue["current"] if revenue else 0
+    prev_monthly_revenue = revenue["previous"] if revenue else 0
     
     # Calculate percentage change
     if prev_monthly_revenue > 0:
@@ -89,9 +75,9 @@ def dashboard():
     })
     
     # Get plan distribution
-    basic_plan = subscription_model.get_plan_by_name("Basic")
-    standard_plan = subscription_model.get_plan_by_name("Standard")
-    premium_plan = subscription_model.get_plan_by_name("Premium")
+    basic_plan = plan_model.get_plan_by_name("Basic")
+    standard_plan = plan_model.get_plan_by_name("Standard")
+    premium_plan = plan_model.get_plan_by_name("Premium")
     
     basic_count = user_model.collection.count_documents({
         "subscription.status": "active", 
@@ -175,10 +161,14 @@ def dashboard():
     # Get recent transactions
     recent_transactions_cursor = transaction_model.collection.find().sort("createdAt", -1).limit(5)
     recent_transactions = []
+    transactions = list(recent_transactions_cursor)
+    
+    # Load every plan the transactions refer to in one query
+    plans_by_id = plan_model.get_plans_by_ids(tx["planId"] for tx in transactions if tx.get("planId"))
     
-    for tx in recent_transactions_cursor:
+    for tx in transactions:
         # Get plan name
-        plan = subscription_model.get_plan_by_id(tx["planId"])
+        plan = plans_by_id.get(str(tx.get("planId")))
         plan_name = plan["name"] if plan else "Unknown Plan"
         
         # Get username
@@ -245,7 +235,6 @@ def dashboard():
 def admin_refresh_stats():
     """API endpoint to refresh admin dashboard statistics."""
     # Get current user for logging
-    user_model = User()
     current_user = user_model.get_user_by_id(session['user_id'])
     
     logger.info(f"Admin '{current_user['username']}' refreshed dashboard statistics")
@@ -9,8 +9,8 @@ from flask import (
 )
 
 from web.utils.decorators import admin_required
-from database.models.user import User
 from database.models.system_log import SystemLog
+from database.models import user_model
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -26,7 +26,6 @@ def register_routes(admin_bp):
 def logs():
     """System logs page."""
     # Get current user for the template
-    user_model = User()
     current_user = user_model.get_user_by_id(session['user_id'])
     
     # Initialize system log model
@@ -169,7 +168,6 @@ def get_log_details(log_id):
 def download_logs():
     """Download logs based on filter criteria."""
     # Get current user for logging
-    user_model = User()
     current_user = user_model.get_user_by_id(session['user_id'])
     
     # Get form data
@@ -238,7 +236,6 @@ def download_logs():
 def clear_logs():
     """Clear old logs from the system."""
     # Get current user for logging
-    user_model = User()
     current_user = user_model.get_user_by_id(session['user_id'])
     
     # Get form data
@@ -10,9 +10,9 @@ from flask import (
 )
 
 from web.utils.decorators import admin_required
-from database.models.user import User
 from web.maintenance import enable_maintenance_mode, disable_maintenance_mode, get_maintenance_status
 from database.models.system_log import SystemLog
+from database.models import user_model
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -27,7 +27,6 @@ def register_routes(admin_bp):
 def maintenance():
     """System maintenance page."""
     # Get current user for the template
-    user_model = User()
     current_user = user_model.get_user_by_id(session['user_id'])
     
     # Get maintenance status
@@ -86,7 +85,6 @@ def update_maintenance():
     Handles both form submissions and API requests.
     """
     # Get current user for the template
-    user_model = User()
     current_user = user_model.get_user_by_id(session['user_id'])
     
     # Get request data (supporting both JSON and form data)
@@ -208,7 +206,6 @@ def update_maintenance():
 def generate_report():
     """Generate various reports."""
     # Get current user for the template
-    user_model = User()
     current_user = user_model.get_user_by_id(session['user_id'])
     
     # Get form data
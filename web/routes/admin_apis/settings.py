@@ -15,8 +15,8 @@ from flask import (
 )
 
 from web.utils.decorators import admin_required
-from database.models.user import User
 from database.settings import Settings
+from database.models import user_model
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -30,7 +30,6 @@ def register_routes(admin_bp):
 def settings():
     """Admin settings page."""
     # Get current user for the template
-    user_model = User()
     current_user = user_model.get_user_by_id(session['user_id'])
     
     # Initialize settings model
@@ -2,6 +2,7 @@
 Admin subscription management routes for Travian Whispers web application.
 """
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from flask import (
     render_template, request, redirect, 
     url_for, flash, session, current_app
@@ -9,12 +10,20 @@ from flask import (
 from bson import ObjectId
 
 from web.utils.decorators import admin_required
-from database.models.user import User
-from database.models.subscription import SubscriptionPlan
+from database.models import user_model, plan_model, transaction_model
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
+# Admin pages only render and log the current user's name
+ADMIN_USER_PROJECTION = {'username': 1, 'email': 1, 'role': 1}
+
+# One row per plan; large enough that the whole result arrives in a single batch
+PLAN_BATCH_SIZE = 200
+
+# Shared pool for fanning out independent MongoDB reads (PyMongo is thread-safe)
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='admin-subscriptions')
+
 def register_routes(admin_bp):
     """Register subscription management routes with the admin blueprint."""
     # Attach routes to the blueprint
@@ -23,34 +32,80 @@ def register_routes(admin_bp):
     admin_bp.route('/subscriptions/edit/<plan_id>', methods=['GET', 'POST'])(admin_required(edit_plan))
     admin_bp.route('/subscriptions/delete/<plan_id>', methods=['POST'])(admin_required(delete_plan))
     
+def _require_oid(plan_id):
+    """
+    Parse a plan ID from the URL, rejecting malformed IDs before any query runs.
+    
+    Args:
+        plan_id (str): Plan ID from the request path
+        
+    Returns:
+        ObjectId: Parsed ID, or None if the string is not a valid ObjectId
+    """
+    if not ObjectId.is_valid(plan_id):
+        logger.warning(f"Rejected malformed plan ID: {plan_id!r}")
+        return None
+    return ObjectId(plan_id)
+
+def get_plan_subscriber_stats():
+    """
+    Count active subscribers and monthly revenue for every plan in a single aggregation.
+    
+    Returns:
+        dict: Mapping of plan ObjectId to ``{'users': int, 'revenue': float}``
+    """
+    pipeline = [
+        {"$match": {
+            "subscription.status": "active",
+            "subscription.planId": {"$ne": None}
+        }},
+        {"$group": {
+            "_id": "$subscription.planId",
+            "users": {"$sum": 1}
+        }},
+        {"$lookup": {
+            "from": "subscriptionPlans",
+            "localField": "_id",
+            "foreignField": "_id",
+            "as": "plan"
+        }},
+        {"$unwind": "$plan"},
+        {"$project": {
+            "users": 1,
+            "revenue": {"$multiply": ["$users", "$plan.price.monthly"]}
+        }}
+    ]
+    
+    return {
+        row["_id"]: {"users": row["users"], "revenue": row["revenue"]}
+        for row in user_model.collection.aggregate(
+            pipeline, batchSize=PLAN_BATCH_SIZE, allowDiskUse=False
+        )
+    }
+
 def subscriptions():
     """Subscription plans management page."""
-    # Get current user for the template
-    user_model = User()
-    current_user = user_model.get_user_by_id(session['user_id'])
-    
-    # Get subscription plans
-    subscription_model = SubscriptionPlan()
-    plans = subscription_model.list_plans()
-    
-    # Add user count and revenue to each plan
-    for plan in plans:
-        # Count users with this plan
-        plan_id = plan["_id"]
-        user_count = user_model.collection.count_documents({
-            "subscription.planId": plan_id,
-            "subscription.status": "active"
-        })
-        
-        # Calculate monthly revenue
-        monthly_revenue = user_count * plan["price"]["monthly"]
-        
-        # Add to plan object
-        plan["users"] = user_count
-        plan["revenue"] = monthly_revenue
-        
-        # Format price for display
-        plan["price"] = f"${plan['price']['monthly']}"
+    # Fetch the current user (for the template) and the per-plan stats
+    # concurrently with the plan list
+    user_future = _executor.submit(
+        user_model.get_user_by_id, session['user_id'], ADMIN_USER_PROJECTION
+    )
+    stats_future = _executor.submit(get_plan_subscriber_stats)
+    plans = plan_model.list_plans()
+    plan_stats = stats_future.result()
+    
+    # Add user count, monthly revenue and display price to each plan
+    empty_stats = {"users": 0, "revenue": 0}
+    plans = [
+        {
+            **plan,
+            **plan_stats.get(plan["_id"], empty_stats),
+            "price": f"${plan['price']['monthly']}"
+        }
+        for plan in plans
+    ]
+    
+    current_user = user_future.result()
     
     # Render subscription plans template
     return render_template(
@@ -63,8 +118,7 @@ def subscriptions():
 def create_plan():
     """Create subscription plan page."""
     # Get current user for the template
-    user_model = User()
-    current_user = user_model.get_user_by_id(session['user_id'])
+    current_user = user_model.get_user_by_id(session['user_id'], ADMIN_USER_PROJECTION)
     
     if request.method == 'POST':
         # Process form submission
@@ -84,8 +138,7 @@ def create_plan():
         }
         
         # Create new plan
-        subscription_model = SubscriptionPlan()
-        new_plan = subscription_model.create_plan(
+        new_plan = plan_model.create_plan(
             name=name,
             description=description,
             monthly_price=monthly_price,
@@ -110,13 +163,16 @@ def create_plan():
 
 def edit_plan(plan_id):
     """Edit subscription plan page."""
+    plan_oid = _require_oid(plan_id)
+    if plan_oid is None:
+        flash('Invalid plan ID', 'danger')
+        return redirect(url_for('admin.subscriptions'))
+    
     # Get current user for the template
-    user_model = User()
-    current_user = user_model.get_user_by_id(session['user_id'])
+    current_user = user_model.get_user_by_id(session['user_id'], ADMIN_USER_PROJECTION)
     
     # Get subscription plan
-    subscription_model = SubscriptionPlan()
-    plan = subscription_model.get_plan_by_id(plan_id)
+    plan = plan_model.get_plan_by_id(plan_oid)
     
     if not plan:
         flash('Plan not found', 'danger')
@@ -150,10 +206,14 @@ def edit_plan(plan_id):
             'features': features
         }
         
-        # Update plan
-        success = subscription_model.update_plan(plan_id, update_data)
+        # Update plan using the already-parsed ObjectId from the fetched document
+        success = plan_model.update_plan(plan["_id"], update_data)
         
         if success:
+            # Keep the plan name copied onto transactions in step with a rename
+            if name != plan['name']:
+                transaction_model.refresh_plan_name(plan["_id"], name)
+            
             flash('Subscription plan updated successfully', 'success')
             logger.info(f"Admin '{current_user['username']}' updated subscription plan '{name}'")
             return redirect(url_for('admin.subscriptions'))
@@ -171,30 +231,31 @@ def edit_plan(plan_id):
 
 def delete_plan(plan_id):
     """Delete subscription plan."""
+    plan_oid = _require_oid(plan_id)
+    if plan_oid is None:
+        flash('Invalid plan ID', 'danger')
+        return redirect(url_for('admin.subscriptions'))
+    
     # Get current user for the template
-    user_model = User()
-    current_user = user_model.get_user_by_id(session['user_id'])
+    current_user = user_model.get_user_by_id(session['user_id'], ADMIN_USER_PROJECTION)
     
-    # Get subscription plan
-    subscription_model = SubscriptionPlan()
-    plan = subscription_model.get_plan_by_id(plan_id)
+    # Get subscription plan and whether it has an active subscriber in one round trip.
+    # Only existence matters, so the subscriber count is deliberately not reported.
+    # A user could still subscribe between this check and the delete; that is
+    # accepted because plan deletion is a rare admin action and a subscription
+    # to a deleted plan only shows as 'Unknown Plan' until it expires
+    plan = plan_model.get_plan_with_active_subscriber(plan_oid)
     
     if not plan:
         flash('Plan not found', 'danger')
         return redirect(url_for('admin.subscriptions'))
     
-    # Check if plan has active users
-    user_count = user_model.collection.count_documents({
-        "subscription.planId": ObjectId(plan_id),
-        "subscription.status": "active"
-    })
-    
-    if user_count > 0:
-        flash(f'Cannot delete plan: {user_count} active users are subscribed to this plan', 'danger')
+    if plan['has_active_users']:
+        flash('Cannot delete plan: active users are subscribed to this plan', 'danger')
         return redirect(url_for('admin.subscriptions'))
     
-    # Delete plan
-    success = subscription_model.delete_plan(plan_id)
+    # Delete plan by its already-parsed ObjectId
+    success = plan_model.delete_plan(plan['_id'])
     
     if success:
         flash('Subscription plan deleted successfully', 'success')
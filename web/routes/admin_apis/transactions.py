@@ -1,22 +1,30 @@
 """
 Admin transaction management routes for Travian Whispers web application.
 """
+import base64
+import hashlib
 import logging
+import re
 from datetime import datetime, timedelta
-from database.models.activity_log import ActivityLog
 from flask import (
     render_template, request, redirect, 
-    url_for, flash, session, current_app, jsonify
+    url_for, flash, session, current_app, jsonify, make_response
 )
 from bson import ObjectId
+from cachelib import SimpleCache
 from web.utils.decorators import admin_required
-from database.models.user import User
-from database.models.subscription import SubscriptionPlan
-from database.models.transaction import Transaction
+from web.utils import activity_queue
+from web.utils.background import run_in_background
+from web.utils.helpers import get_current_user
+from database.models import user_model, plan_model, transaction_model
+from payment.paypal import process_successful_payment
 def format_mongodb_date(date_field, format='%Y-%m-%d'):
     """
     Format a date field that could be either a datetime object or a MongoDB date dictionary.
     
+    Documents read through PyMongo always carry datetime objects; the dictionary
+    form only shows up in serialized JSON (imports, exports, API payloads).
+    
     Args:
         date_field: A datetime object or MongoDB date dictionary
         format: The desired date format string
@@ -24,22 +32,21 @@ def format_mongodb_date(date_field, format='%Y-%m-%d'):
     Returns:
         str: Formatted date string
     """
-    if isinstance(date_field, dict) and "$date" in date_field:
+    if hasattr(date_field, 'strftime'):
+        # Handle datetime object (what PyMongo returns, so checked first)
+        return date_field.strftime(format)
+    elif isinstance(date_field, dict) and "$date" in date_field:
         # Handle MongoDB date dictionary
         date_str = date_field["$date"]
         # If it's an ISO format string, we can parse it
         if 'T' in date_str:
             try:
-                from datetime import datetime
                 dt = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
                 return dt.strftime(format)
-            except:
+            except ValueError:
                 # If parsing fails, just return the date part
                 return date_str.split('T')[0]
         return date_str
-    elif hasattr(date_field, 'strftime'):
-        # Handle datetime object
-        return date_field.strftime(format)
     else:
         # Default fallback
         return str(date_field)
@@ -47,6 +54,166 @@ def format_mongodb_date(date_field, format='%Y-%m-%d'):
 # Initialize logger
 logger = logging.getLogger(__name__)
 
+# Collection-wide stats do not depend on filters or paging; keep them briefly
+# and drop them whenever an admin changes a transaction status
+STATS_CACHE_TIMEOUT = 60
+_stats_cache = SimpleCache(threshold=1, default_timeout=STATS_CACHE_TIMEOUT)
+
+# Set once no transaction predates the userDenorm backfill
+_all_denormalized = False
+
+# Key pattern of the transactions (status, createdAt) index from create_indexes()
+STATUS_CREATED_AT_INDEX = [("status", 1), ("createdAt", -1)]
+
+# Above this many transactions the filtered list stops combining page and total in a
+# $facet and runs a plain query plus a count instead: the sort inside $facet cannot
+# use an index, so every matched row would be sorted in memory
+FACET_MAX_DOCUMENTS = 100000
+
+# Bounds on list paging: rows per page and how many rows an offset may skip
+MAX_PER_PAGE = 200
+MAX_SKIP = 10000
+
+# Date format of the transactions list
+LIST_DATE_FORMAT = '%Y-%m-%d'
+
+# Fields update_transaction_status reads; only the details page needs the full document
+STATUS_UPDATE_PROJECTION = {"status": 1, "paymentId": 1, "userId": 1}
+
+# Statuses a transaction can be moved to
+_VALID_STATUSES = frozenset({'pending', 'completed', 'failed', 'refunded'})
+_INVALID_STATUS_MSG = 'Invalid status. Must be one of: completed, failed, pending, refunded'
+
+def _build_date_range(date_from, date_to):
+    """
+    Build a createdAt range filter from the list page's date inputs.
+    
+    Invalid dates are flashed as warnings and left out of the range.
+    
+    Args:
+        date_from (str): Start date as YYYY-MM-DD, or None
+        date_to (str): End date as YYYY-MM-DD (inclusive), or None
+        
+    Returns:
+        dict: ``$gte``/``$lte`` filter, empty if no valid dates were given
+    """
+    date_filter = {}
+    
+    if date_from:
+        try:
+            date_filter["$gte"] = datetime.strptime(date_from, "%Y-%m-%d")
+        except ValueError:
+            flash("Invalid 'from' date format", "warning")
+    
+    if date_to:
+        try:
+            # Set time to end of day
+            date_filter["$lte"] = datetime.strptime(date_to, "%Y-%m-%d").replace(hour=23, minute=59, second=59)
+        except ValueError:
+            flash("Invalid 'to' date format", "warning")
+    
+    return date_filter
+
+def _encode_cursor(tx):
+    """
+    Encode a transaction's sort key as an opaque pagination cursor.
+    
+    Args:
+        tx (dict): Last transaction on the current page
+        
+    Returns:
+        str: URL-safe cursor for the ``after`` parameter
+    """
+    raw = f"{tx['createdAt'].isoformat()}|{tx['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor):
+    """
+    Decode a pagination cursor produced by _encode_cursor.
+    
+    Args:
+        cursor (str): Value of the ``after`` parameter
+        
+    Returns:
+        tuple: (createdAt, ObjectId) or None if the cursor is malformed
+    """
+    try:
+        created_at, tx_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), ObjectId(tx_id)
+    except Exception:
+        return None
+
+def _etag_for(collection, *extra):
+    """
+    Build a weak ETag for a whole collection.
+    
+    Validation costs a single query: the newest updatedAt, read from its index.
+    Every insert and update sets updatedAt, and transactions are never deleted,
+    so the tag changes whenever the collection does and repeat polls of
+    unchanged data can be answered with 304 Not Modified.
+    
+    Args:
+        collection: PyMongo collection to inspect
+        *extra: Additional values that affect the rendered page
+        
+    Returns:
+        str: ETag value (without the weak prefix)
+    """
+    latest = next(
+        collection.find({}, {"_id": 0, "updatedAt": 1}).sort([("updatedAt", -1)]).limit(1),
+        None
+    )
+    latest_ts = latest.get("updatedAt") if latest else None
+    
+    return hashlib.md5(repr((latest_ts,) + extra).encode()).hexdigest()
+
+def _not_modified(etag):
+    """
+    Check whether the client already has the current version of a page.
+    
+    Pending flash messages are only shown on a full render, so a 304 is never
+    returned while any are queued.
+    
+    Args:
+        etag (str): Current ETag value
+        
+    Returns:
+        bool: True if a 304 response can be sent
+    """
+    return request.if_none_match.contains_weak(etag) and not session.get('_flashes')
+
+def _not_modified_response(etag):
+    """
+    Build a 304 Not Modified response carrying the ETag it matched.
+    
+    Args:
+        etag (str): ETag value
+        
+    Returns:
+        Response: Empty 304 response
+    """
+    response = make_response('', 304)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def _with_etag(body, etag):
+    """
+    Wrap a rendered page in a response carrying a weak ETag.
+    
+    Args:
+        body (str): Rendered template
+        etag (str): ETag value
+        
+    Returns:
+        Response: Flask response
+    """
+    response = make_response(body)
+    response.set_etag(etag, weak=True)
+    # Make the browser revalidate on every visit instead of reusing a stale copy
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 def register_routes(admin_bp):
     """Register transaction management routes with the admin blueprint."""
     # Attach routes to the blueprint
@@ -55,15 +222,106 @@ def register_routes(admin_bp):
     admin_bp.route('/transactions/update-status/<transaction_id>', methods=['POST'])(admin_required(update_transaction_status))
     admin_bp.route('/transactions/send-receipt/<transaction_id>', methods=['POST'])(admin_required(send_transaction_receipt))
 
+def _fill_missing_names(page_docs):
+    """
+    Resolve usernames and plan names for rows written before they were
+    denormalized, with one batched query per collection for the whole page.
+    
+    Args:
+        page_docs (list): Projected transaction rows, updated in place
+    """
+    uids = {ObjectId(d["userId"]) for d in page_docs
+            if "username" not in d and ObjectId.is_valid(d.get("userId"))}
+    pids = {d["planId"] for d in page_docs if "planName" not in d and d.get("planId")}
+    
+    if uids:
+        users_by_id = {str(u["_id"]): u["username"] for u in user_model.collection.find(
+            {"_id": {"$in": list(uids)}}, {"username": 1}
+        )}
+        for d in page_docs:
+            if "username" not in d and d.get("userId") in users_by_id:
+                d["username"] = users_by_id[d["userId"]]
+    
+    if pids:
+        plans_by_id = {p["_id"]: p["name"] for p in plan_model.collection.find(
+            {"_id": {"$in": list(pids)}}, {"name": 1}
+        )}
+        for d in page_docs:
+            if "planName" not in d and d.get("planId") in plans_by_id:
+                d["planName"] = plans_by_id[d["planId"]]
+
+def _get_stats():
+    """
+    Get collection-wide revenue and status counts, cached for a short time.
+    
+    Returns:
+        dict: ``total_revenue`` (formatted), ``completed`` and ``pending`` counts
+    """
+    stats = _stats_cache.get('stats')
+    if stats is None:
+        stats = _compute_stats()
+        _stats_cache.set('stats', stats)
+    return stats
+
+def _compute_stats():
+    """
+    Compute collection-wide revenue and status counts in one aggregation.
+    
+    Returns:
+        dict: ``total_revenue`` (formatted), ``completed`` and ``pending`` counts
+    """
+    pipeline = [
+        # Only completed and pending rows contribute; this match can use the status index
+        {"$match": {"status": {"$in": ["completed", "pending"]}}},
+        {"$group": {
+            "_id": None,
+            "revenue": {"$sum": {"$cond": [{"$eq": ["$status", "completed"]}, "$amount", 0]}},
+            "completed": {"$sum": {"$cond": [{"$eq": ["$status", "completed"]}, 1, 0]}},
+            "pending": {"$sum": {"$cond": [{"$eq": ["$status", "pending"]}, 1, 0]}}
+        }}
+    ]
+    totals = next(transaction_model.collection.aggregate(pipeline), None) or {}
+    
+    return {
+        'total_revenue': f"${totals.get('revenue', 0):.2f}",
+        'completed': totals.get('completed', 0),
+        'pending': totals.get('pending', 0)
+    }
+
+def _transactions_denormalized():
+    """
+    Check whether every transaction carries its denormalized user fields.
+    
+    New transactions always get them, so once the backfill has covered the
+    old ones the answer cannot change and is not checked again.
+    
+    Returns:
+        bool: True if no transaction lacks userDenorm
+    """
+    global _all_denormalized
+    
+    if not _all_denormalized:
+        _all_denormalized = transaction_model.collection.find_one(
+            {"userDenorm": {"$exists": False}}, {"_id": 1}
+        ) is None
+    
+    return _all_denormalized
+
 def transactions():
     """Transaction history page."""
-    # Get current user for the template
-    user_model = User()
-    current_user = user_model.get_user_by_id(session['user_id'])
+    # The page also shows collection-wide stats, so the ETag covers every
+    # transaction rather than just the filtered ones; plan names are shown too and
+    # come from the in-process plan cache, so they add no query
+    etag = _etag_for(
+        transaction_model.collection,
+        [(str(plan['_id']), plan['name']) for plan in plan_model.list_plans_cached()],
+        sorted(request.args.items(multi=True)), session['user_id']
+    )
+    if _not_modified(etag):
+        return _not_modified_response(etag)
     
-    # Initialize models
-    transaction_model = Transaction()
-    subscription_model = SubscriptionPlan()
+    # Get current user for the template
+    current_user = get_current_user()
     
     # Get filter parameters
     status_filter = request.args.get('status')
@@ -76,108 +334,167 @@ def transactions():
     query_filter = {}
     
     if status_filter:
-        query_filter["status"] = status_filter
+        if status_filter in _VALID_STATUSES:
+            query_filter["status"] = status_filter
+        else:
+            flash(_INVALID_STATUS_MSG, "warning")
     
     if plan_filter:
         # Find the plan ID first
-        plan = subscription_model.get_plan_by_name(plan_filter)
+        plan = plan_model.get_plan_by_name(plan_filter)
         if plan:
             query_filter["planId"] = plan["_id"]
     
     # Add date range filter
-    if date_from or date_to:
-        date_filter = {}
-        
-        if date_from:
-            try:
-                from_date = datetime.strptime(date_from, "%Y-%m-%d")
-                date_filter["$gte"] = from_date
-            except ValueError:
-                flash("Invalid 'from' date format", "warning")
-        
-        if date_to:
-            try:
-                to_date = datetime.strptime(date_to, "%Y-%m-%d")
-                # Set time to end of day
-                to_date = to_date.replace(hour=23, minute=59, second=59)
-                date_filter["$lte"] = to_date
-            except ValueError:
-                flash("Invalid 'to' date format", "warning")
-        
-        if date_filter:
-            query_filter["createdAt"] = date_filter
+    date_filter = _build_date_range(date_from, date_to)
+    if date_filter:
+        query_filter["createdAt"] = date_filter
     
     # Add search filter if provided
+    no_matches = False
     if search_query:
-        # We need to find users matching the search then filter transactions by those users
-        matching_users = list(user_model.collection.find(
-            {"$or": [
-                {"username": {"$regex": search_query, "$options": "i"}},
-                {"email": {"$regex": search_query, "$options": "i"}}
-            ]}
-        ))
+        # Searches are always prefix matches on username or email; the input is
+        # escaped so it can never be interpreted as a (possibly pathological) pattern
+        prefix = {"$regex": f"^{re.escape(search_query)}", "$options": "i"}
+        prefix_match = [{"username": prefix}, {"email": prefix}]
         
-        if matching_users:
-            user_ids = [str(user["_id"]) for user in matching_users]
-            query_filter["userId"] = {"$in": user_ids}
+        if user_model.collection.find_one({"$or": prefix_match}, {"_id": 1}) is None:
+            # No user matches, so no transaction can either; skip the transactions query
+            no_matches = True
         else:
-            # No matching users, add impossible condition to return no results
-            query_filter["userId"] = "no-match"
+            # Match against the user fields copied onto each transaction, so the
+            # search needs no join at all
+            search_filter = [
+                {"userDenorm.username": prefix},
+                {"userDenorm.email": prefix}
+            ]
+            if not _transactions_denormalized():
+                # Rows the backfill has not reached yet carry no user fields; match them by userId
+                user_ids = [str(user["_id"]) for user in user_model.collection.find({"$or": prefix_match}, {"_id": 1})]
+                search_filter.append({"userDenorm": {"$exists": False}, "userId": {"$in": user_ids}})
+            query_filter["$or"] = search_filter
     
     # Fetch transactions from database with pagination
-    page = int(request.args.get('page', 1))
-    per_page = int(request.args.get('per_page', 20))
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = min(MAX_PER_PAGE, max(1, int(request.args.get('per_page', 20))))
+    except ValueError:
+        page, per_page = 1, 20
     
-    # Calculate skip and limit for pagination
+    # Calculate skip and limit for pagination; an `after` cursor replaces the
+    # skip with a range condition so deep pages cost the same as the first
     skip = (page - 1) * per_page
+    page_filter = {}
+    
+    after = request.args.get('after')
+    if after:
+        keyset = _decode_cursor(after)
+        if keyset:
+            after_ts, after_id = keyset
+            page_filter = {"$or": [
+                {"createdAt": {"$lt": after_ts}},
+                {"createdAt": after_ts, "_id": {"$lt": after_id}}
+            ]}
+            skip = 0
+        else:
+            flash("Invalid page cursor", "warning")
+    
+    # Deep offsets make the server walk and discard every skipped row; past the
+    # cap only cursor paging (the Next link) is allowed
+    if skip > MAX_SKIP:
+        flash("That page is too deep to jump to directly; use Next to page through results", "warning")
+        args = {k: v for k, v in request.args.items() if k not in ('page', 'after')}
+        return redirect(url_for('admin.transactions', **args))
+    
+    # Usernames and plan names are denormalized onto each transaction, so a page
+    # is read from the transactions collection alone
+    page_stages = [
+        {"$match": page_filter},
+        {"$sort": {"createdAt": -1, "_id": -1}},
+        {"$skip": skip},
+        {"$limit": per_page},
+        {"$project": {
+            "amount": 1,
+            "status": 1,
+            "createdAt": 1,
+            "userId": 1,
+            "planId": 1,
+            "username": "$userDenorm.username",
+            "planName": "$planDenorm.name"
+        }}
+    ]
+    
+    if no_matches:
+        page_docs = []
+        total_count = 0
+    elif query_filter:
+        # With a status and a date range, pin the (status, createdAt) index: it covers the
+        # equality, the sort and the range, and the planner can otherwise settle on the
+        # createdAt-only index and filter status in memory
+        query_options = {}
+        if "status" in query_filter and "createdAt" in query_filter:
+            query_options["hint"] = STATUS_CREATED_AT_INDEX
+        
+        if transaction_model.collection.estimated_document_count() <= FACET_MAX_DOCUMENTS:
+            # Get the page of transactions and the filtered total in a single round trip
+            pipeline = [
+                {"$match": query_filter},
+                {"$facet": {
+                    "data": page_stages,
+                    "total": [{"$count": "n"}]
+                }}
+            ]
+            result = next(
+                transaction_model.collection.aggregate(pipeline, **query_options),
+                {"data": [], "total": []}
+            )
+            page_docs = result["data"]
+            total_count = result["total"][0]["n"] if result["total"] else 0
+        else:
+            # On a large collection an index-backed sort plus a separate count beats
+            # saving the round trip
+            page_docs = list(transaction_model.collection.aggregate(
+                [{"$match": query_filter}, *page_stages], **query_options
+            ))
+            total_count = transaction_model.collection.count_documents(query_filter, **query_options)
+    else:
+        # Unfiltered: read the total from collection metadata instead of counting
+        page_docs = list(transaction_model.collection.aggregate(page_stages))
+        total_count = transaction_model.collection.estimated_document_count()
     
-    # Get total count for pagination
-    total_count = transaction_model.collection.count_documents(query_filter)
-    
-    # Get transactions with pagination
-    transactions_cursor = transaction_model.collection.find(query_filter)\
-        .sort("createdAt", -1)\
-        .skip(skip)\
-        .limit(per_page)
-    
-    # Format transactions for template
-    formatted_transactions = []
+    _fill_missing_names(page_docs)
     
-    for tx in transactions_cursor:
-        # Get user information
-        user = user_model.get_user_by_id(str(tx["userId"]))
-        username = user["username"] if user else "Unknown User"
-        
-        # Get plan information
-        plan = subscription_model.get_plan_by_id(str(tx["planId"]))
-        plan_name = plan["name"] if plan else "Unknown Plan"
-        
-        # Format for template
-        formatted_transactions.append({
+    # Format transactions for template (PyMongo always decodes BSON dates to datetime);
+    # a generator, since the template loops over the rows exactly once
+    formatted_transactions = (
+        {
             'id': str(tx["_id"]),
-            'user': username,
-            'plan': plan_name,
+            'user': tx.get("username", "Unknown User"),
+            'plan': tx.get("planName", "Unknown Plan"),
             'amount': f"${tx['amount']:.2f}",
-            'date': tx["createdAt"]["$date"].split('T')[0] if isinstance(tx["createdAt"], dict) and "$date" in tx["createdAt"] else tx["createdAt"].strftime('%Y-%m-%d'),
+            'date': tx["createdAt"].strftime(LIST_DATE_FORMAT),
             'status': tx["status"]
-        })
+        }
+        for tx in page_docs
+    )
     
     # Get all subscription plans for filter dropdown
-    all_plans = subscription_model.list_plans()
+    all_plans = plan_model.list_plans_cached()
     
     # Calculate transaction statistics
     stats = {
         'total_transactions': total_count,
-        'total_revenue': f"${sum(tx.get('amount', 0) for tx in transaction_model.collection.find({'status': 'completed'})):.2f}",
-        'completed': transaction_model.collection.count_documents({"status": "completed"}),
-        'pending': transaction_model.collection.count_documents({"status": "pending"})
+        **_get_stats()
     }
     
     # Calculate pagination variables
     total_pages = (total_count + per_page - 1) // per_page if total_count > 0 else 1
     
+    # A full page means there may be more rows; hand out a cursor to the next one
+    next_cursor = _encode_cursor(page_docs[-1]) if len(page_docs) == per_page else None
+    
     # Render transactions template
-    return render_template(
+    return _with_etag(render_template(
         'admin/transactions.html',
         transactions=formatted_transactions,
         stats=stats,
@@ -186,21 +503,17 @@ def transactions():
             'page': page,
             'per_page': per_page,
             'total': total_count,
-            'total_pages': total_pages
+            'total_pages': total_pages,
+            'next_cursor': next_cursor
         },
         current_user=current_user,
         title='Transaction History'
-    )
+    ), etag)
 
 def transaction_details(transaction_id):
     """Transaction details page."""
     # Get current user for the template
-    user_model = User()
-    current_user = user_model.get_user_by_id(session['user_id'])
-    
-    # Initialize models
-    transaction_model = Transaction()
-    subscription_model = SubscriptionPlan()
+    current_user = get_current_user()
     
     # Get transaction
     tx = transaction_model.get_transaction(transaction_id)
@@ -210,12 +523,22 @@ def transaction_details(transaction_id):
         return redirect(url_for('admin.transactions'))
     
     # Get user
-    user = user_model.get_user_by_id(str(tx["userId"]))
+    user = user_model.get_user_by_id(tx["userId"])
+    
+    # The page only depends on this transaction, its user and the viewing admin
+    etag = hashlib.md5(repr((
+        tx.get("updatedAt", tx["createdAt"]),
+        user.get("updatedAt") if user else None,
+        session['user_id']
+    )).encode()).hexdigest()
+    if _not_modified(etag):
+        return _not_modified_response(etag)
+    
     username = user["username"] if user else "Unknown User"
     email = user["email"] if user else "Unknown Email"
     
     # Get plan
-    plan = subscription_model.get_plan_by_id(str(tx["planId"]))
+    plan = plan_model.get_plan_by_id_cached(tx["planId"])
     plan_name = plan["name"] if plan else "Unknown Plan"
     
     # Format dates as strings
@@ -229,7 +552,7 @@ def transaction_details(transaction_id):
     transaction = {
         'id': str(tx["_id"]),
         'user': username,
-        'user_id': str(tx["userId"]),
+        'user_id': tx["userId"],
         'user_email': email,
         'plan': plan_name,
         'amount': f"${tx['amount']:.2f}",
@@ -252,117 +575,147 @@ def transaction_details(transaction_id):
     }
     
     # Render transaction details template
-    return render_template(
-    'admin/transaction_details.html',
-    transaction=transaction,
-    current_user=current_user,
-    title='Transaction Details'
-)
+    return _with_etag(render_template(
+        'admin/transaction_details.html',
+        transaction=transaction,
+        current_user=current_user,
+        title='Transaction Details'
+    ), etag)
 
-def update_transaction_status(transaction_id, status):
-    """API endpoint to update transaction status."""
-    # Get transaction details
-    transaction_model = Transaction()
-    tx = transaction_model.get_transaction(transaction_id)
+def _process_payment(transaction_id, payment_id):
+    """
+    Complete a pending payment and log the outcome (runs in the background).
     
-    if not tx:
-        return jsonify({
-            'success': False,
-            'message': 'Transaction not found'
-        }), 404
+    Args:
+        transaction_id (str): Transaction ID
+        payment_id (str): Payment ID from payment gateway
+    """
+    # The transaction is pending again, so an earlier completion must not short-circuit
+    success = process_successful_payment(payment_id, reprocess=True)
+    _stats_cache.delete('stats')
     
-    # Check if status is valid
-    valid_statuses = ['pending', 'completed', 'failed', 'refunded']
-    if status not in valid_statuses:
+    if success:
+        logger.info(f"Successfully processed payment for transaction {transaction_id}")
+    else:
+        logger.error(f"Failed to process payment for transaction {transaction_id}")
+
+def update_transaction_status(transaction_id, status):
+    """API endpoint to update transaction status."""
+    # Check if status is valid before touching the database
+    if status not in _VALID_STATUSES:
         return jsonify({
             'success': False,
-            'message': f'Invalid status: {status}'
+            'message': _INVALID_STATUS_MSG
         }), 400
     
-    # Check current status
-    if tx['status'] == status:
+    # Completing a pending transaction means processing its payment, which
+    # sets the status itself; every other change is a single compare-and-set
+    if status == 'completed':
+        return _complete_transaction(transaction_id)
+    
+    tx = transaction_model.change_transaction_status(transaction_id, status, STATUS_UPDATE_PROJECTION)
+    
+    if not tx:
+        # Nothing changed: tell a missing transaction from one already in this status
+        if not transaction_model.get_transaction(transaction_id, {"_id": 1}):
+            return jsonify({
+                'success': False,
+                'message': 'Transaction not found'
+            }), 404
+        
         return jsonify({
             'success': True,
             'message': f'Transaction already has status: {status}'
         })
     
-    # Special handling for 'completed' status
-    if status == 'completed' and tx['status'] == 'pending':
-        # Process the completed payment
-        from payment.paypal import process_successful_payment
-        
-        # Call process_successful_payment with only the paymentId
-        process_result = process_successful_payment(tx["paymentId"])
-        
-        if process_result:
-            logger.info(f"Successfully processed payment for transaction {transaction_id}")
-            
-            return jsonify({
-                'success': True,
-                'message': 'Transaction status updated and payment processed successfully'
-            })
-        else:
-            logger.error(f"Failed to process payment for transaction {transaction_id}")
-            
-            return jsonify({
-                'success': False,
-                'message': 'Failed to process payment'
-            }), 500
+    _stats_cache.delete('stats')
     
     # For change from 'completed' to something else - handle subscription accordingly
-    if tx['status'] == 'completed' and status != 'completed':
-        # Get user model and update subscription status
-        user_model = User()
-        
+    if tx['status'] == 'completed':
         # Update subscription status to inactive
-        # Check if the method exists and use it, otherwise update directly
         try:
-            if hasattr(user_model, 'update_subscription_status'):
-                user_model.update_subscription_status(str(tx["userId"]), "inactive")
-            else:
-                # Direct update if method not available
-                user_model.collection.update_one(
-                    {'_id': ObjectId(tx["userId"])},
-                    {'$set': {
-                        'subscription.status': 'inactive',
-                        'updatedAt': datetime.utcnow()
-                    }}
-                )
-                
+            user_model.update_subscription_status(tx["userId"], "inactive")
             logger.info(f"Updated subscription status to inactive for user {tx['userId']}")
         except Exception as e:
             logger.error(f"Error updating user subscription status: {e}")
     
-    # Update transaction status
-    if transaction_model.update_transaction_status(transaction_id, status):
-        # Log the activity
-        activity_model = ActivityLog()
-        activity_model.log_activity(
-            user_id=str(tx['userId']),
+    # Log the activity
+    activity_queue.log_activity(
+        user_id=tx['userId'],
+        activity_type='transaction-status-update',
+        details=f"Transaction status updated from {tx['status']} to {status}",
+        status='success'
+    )
+    
+    logger.info(f"Transaction {transaction_id} status updated from {tx['status']} to {status}")
+    
+    return jsonify({
+        'success': True,
+        'message': 'Transaction status updated successfully'
+    })
+
+def _complete_transaction(transaction_id):
+    """
+    Mark a transaction completed, processing its payment if it is pending.
+    
+    Args:
+        transaction_id (str): Transaction ID
+    
+    Returns:
+        JSON response
+    """
+    tx = transaction_model.get_transaction(transaction_id, STATUS_UPDATE_PROJECTION)
+    
+    if not tx:
+        return jsonify({
+            'success': False,
+            'message': 'Transaction not found'
+        }), 404
+    
+    if tx['status'] == 'completed':
+        return jsonify({
+            'success': True,
+            'message': 'Transaction already has status: completed'
+        })
+    
+    if tx['status'] == 'pending':
+        # PayPal processing is network-bound, so it runs after the response is sent
+        run_in_background(_process_payment, transaction_id, tx["paymentId"])
+        
+        return jsonify({
+            'success': True,
+            'message': 'Payment processing started; the transaction will be marked completed once it finishes'
+        }), 202
+    
+    # Failed or refunded transactions are re-marked without reprocessing
+    if transaction_model.update_transaction_status(transaction_id, 'completed'):
+        _stats_cache.delete('stats')
+        
+        activity_queue.log_activity(
+            user_id=tx['userId'],
             activity_type='transaction-status-update',
-            details=f"Transaction status updated from {tx['status']} to {status}",
+            details=f"Transaction status updated from {tx['status']} to completed",
             status='success'
         )
         
-        logger.info(f"Transaction {transaction_id} status updated from {tx['status']} to {status}")
+        logger.info(f"Transaction {transaction_id} status updated from {tx['status']} to completed")
         
         return jsonify({
             'success': True,
             'message': 'Transaction status updated successfully'
         })
-    else:
-        logger.error(f"Failed to update transaction status for {transaction_id}")
-        
-        return jsonify({
-            'success': False,
-            'message': 'Failed to update transaction status'
-        }), 500
+    
+    logger.error(f"Failed to update transaction status for {transaction_id}")
+    
+    return jsonify({
+        'success': False,
+        'message': 'Failed to update transaction status'
+    }), 500
         
 def send_transaction_receipt(transaction_id):
     """Send transaction receipt via email."""
     # Get current user for logging
-    user_model = User()
-    current_user = user_model.get_user_by_id(session['user_id'])
+    current_user = get_current_user()
     
     # Get form data
     email = request.form.get('email')
@@ -374,8 +727,7 @@ def send_transaction_receipt(transaction_id):
         return redirect(url_for('admin.transaction_details', transaction_id=transaction_id))
     
     # Get transaction
-    transaction_model = Transaction()
-    tx = transaction_model.get_transaction(transaction_id)
+    tx = transaction_model.get_transaction(transaction_id, {"_id": 1})
     
     if not tx:
         flash('Transaction not found', 'danger')
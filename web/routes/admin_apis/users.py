@@ -11,8 +11,7 @@ from flask import (
 from bson import ObjectId
 
 from web.utils.decorators import admin_required
-from database.models.user import User
-from database.models.subscription import SubscriptionPlan
+from database.models import user_model, plan_model
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -28,9 +27,6 @@ def register_routes(admin_bp):
 
 def users():
     """User management page."""
-    # Initialize user model
-    user_model = User()
-    
     # Get filter parameters
     status_filter = request.args.get('status')
     role_filter = request.args.get('role')
@@ -99,7 +95,11 @@ def users():
     
     # Format users for template
     formatted_users = []
-    subscription_model = SubscriptionPlan()
+    
+    # Load every plan on this page in one query
+    plans_by_id = plan_model.get_plans_by_ids(
+        user["subscription"]["planId"] for user in users if user["subscription"].get("planId")
+    )
     
     for user in users:
         # Get subscription info
@@ -108,7 +108,7 @@ def users():
         
         subscription_plan = "None"
         if plan_id:
-            plan = subscription_model.get_plan_by_id(plan_id)
+            plan = plans_by_id.get(str(plan_id))
             if plan:
                 subscription_plan = plan["name"]
         
@@ -178,12 +178,10 @@ def users():
 def user_create():
     """Create user page."""
     # Get current user for the template
-    user_model = User()
     current_user = user_model.get_user_by_id(session['user_id'])
     
     # Get all subscription plans for the form
-    subscription_model = SubscriptionPlan()
-    all_plans = subscription_model.list_plans()
+    all_plans = plan_model.list_plans()
     
     # Format plans for select dropdown
     plan_choices = [{'value': 'none', 'text': 'No Subscription'}]
@@ -278,7 +276,6 @@ def user_create():
 def user_edit(user_id):
     """Edit user page."""
     # Get current user for the template
-    user_model = User()
     current_user = user_model.get_user_by_id(session['user_id'])
     
     # Get user to edit
@@ -289,8 +286,7 @@ def user_edit(user_id):
         return redirect(url_for('admin.users'))
     
     # Get all subscription plans
-    subscription_model = SubscriptionPlan()
-    all_plans = subscription_model.list_plans()
+    all_plans = plan_model.list_plans()
     
     # Format plans for select dropdown
     plan_choices = [{'value': 'none', 'text': 'No Subscription'}]
@@ -397,7 +393,7 @@ def user_edit(user_id):
     
     if user['subscription']['planId']:
         current_plan_id = str(user['subscription']['planId'])
-        plan = subscription_model.get_plan_by_id(current_plan_id)
+        plan = plan_model.get_plan_by_id_cached(current_plan_id)
         if plan:
             current_plan = {
                 'name': plan['name'],
@@ -432,7 +428,6 @@ def user_edit(user_id):
 def user_delete(user_id):
     """Delete user."""
     # Get current user for the template
-    user_model = User()
     current_user = user_model.get_user_by_id(session['user_id'])
     
     # Get user to delete
@@ -447,17 +442,8 @@ def user_delete(user_id):
         flash('You cannot delete your own account', 'danger')
         return redirect(url_for('admin.users'))
     
-    # Delete user
-    # Check if delete_user method exists, otherwise implement directly
-    if hasattr(user_model, 'delete_user'):
-        success = user_model.delete_user(user_id)
-    else:
-        try:
-            result = user_model.collection.delete_one({"_id": ObjectId(user_id)})
-            success = result.deleted_count > 0
-        except Exception as e:
-            logger.error(f"Error deleting user: {e}")
-            success = False
+    # Delete user and their data
+    success = user_model.delete_user(user_id)
     
     if success:
         flash('User deleted successfully', 'success')
@@ -471,7 +457,6 @@ def user_delete(user_id):
 def admin_get_user(user_id):
     """API endpoint to get user details for admin."""
     # Get current user for logging
-    user_model = User()
     current_user = user_model.get_user_by_id(session['user_id'])
     
     # Get user to view
@@ -484,10 +469,9 @@ def admin_get_user(user_id):
         }), 404
     
     # Get subscription data
-    subscription_model = SubscriptionPlan()
     plan_name = "None"
     if user['subscription']['planId']:
-        plan = subscription_model.get_plan_by_id(user['subscription']['planId'])
+        plan = plan_model.get_plan_by_id_cached(user['subscription']['planId'])
         if plan:
             plan_name = plan['name']
     
@@ -506,7 +490,7 @@ def admin_get_user(user_id):
         'email': user['email'],
         'role': user['role'],
         'status': 'active' if user.get('isVerified', False) else 'inactive',
-        'createdAt': user['createdAt'].strftime('%Y-%m-%d %H:%M:%S') if isinstance(user['createdAt'], datetime) else str(user['createdAt']),
+        'createdAt': user['createdAt'].replace(tzinfo=None).isoformat(sep=' ', timespec='seconds') if isinstance(user['createdAt'], datetime) else str(user['createdAt']),
         'subscription': {
             'status': user['subscription']['status'],
             'planId': str(user['subscription']['planId']) if user['subscription'].get('planId') else None,
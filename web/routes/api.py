@@ -3,34 +3,80 @@ API routes for Travian Whispers web application.
 This module defines the blueprint for API endpoints.
 """
 import logging
-from flask import Blueprint, flash, redirect, request, jsonify, session, current_app, url_for
+from flask import (
+    Blueprint, flash, redirect, request, jsonify, session, current_app, url_for,
+    Response, stream_with_context
+)
+from werkzeug.datastructures import Headers
 from bson import ObjectId
+from pymongo import ReturnDocument
 from datetime import datetime, timedelta
 
 from web.utils.decorators import login_required, admin_required, api_error_handler
-from database.models.user import User
-from database.models.subscription import SubscriptionPlan
-from database.models.activity_log import ActivityLog
-from payment.paypal import create_subscription_order, process_successful_payment
-
-def jsonify_custom(obj):
-    """Custom jsonify function that handles ObjectId and datetime objects."""
-    from flask import jsonify
-    from web.utils.json_encoder import to_json
-    import json
-    
-    # Convert the object to JSON-serializable data using our custom converter
-    serializable_obj = json.loads(json.dumps(obj, default=to_json))
-    
-    # Use Flask's jsonify with pre-serialized data
-    return jsonify(serializable_obj)
+from web.utils import activity_queue
+from web.utils.background import run_in_background
+from web.utils.helpers import get_current_user, get_current_user_oid, get_current_plan, forget_current_user
+from database.models import user_model, plan_model, activity_model, transaction_model
+from payment.paypal import (
+    create_subscription_order, process_successful_payment,
+    handle_webhook_event, verify_webhook_signature, precheck_webhook_headers
+)
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
+# Settings that can only be enabled when the user's plan includes the feature:
+# (setting key, plan feature key, error message)
+_GATED_FEATURES = (
+    ('autoFarm', 'autoFarm', 'Auto-Farm is not included in your subscription plan'),
+    ('trainer', 'trainer', 'Troop Trainer is not included in your subscription plan'),
+)
+
 # Initialize blueprint
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+# Fields get_user_profile returns; everything else (password hash, payment
+# history, ...) stays on the server
+USER_PROFILE_PROJECTION = {
+    '_id': 0,
+    'username': 1,
+    'email': 1,
+    'role': 1,
+    'subscription.status': 1,
+    'subscription.startDate': 1,
+    'subscription.endDate': 1,
+    'settings': 1,
+    'travianCredentials.username': 1,
+    'travianCredentials.server': 1,
+    'travianCredentials.tribe': 1,
+    'villages': 1
+}
+
+# Values reported for settings/credentials a user document does not have
+_DEFAULT_SETTINGS = {'notification': True, 'autoRenew': False, 'autoFarm': False, 'trainer': False}
+_DEFAULT_CREDENTIALS = {'username': '', 'server': '', 'tribe': ''}
+
+# Settings clients may set; everything else under settings is server-managed
+USER_SETTING_KEYS = frozenset({'notification', 'autoRenew', 'autoFarm', 'trainer'})
+
+# Credential fields clients may set; everything else under travianCredentials is server-managed
+TRAVIAN_CREDENTIAL_FIELDS = ('username', 'password', 'server', 'tribe')
+
+# Fields admin_get_user returns; credentials and payment history are left out
+ADMIN_USER_DETAIL_PROJECTION = {
+    'username': 1,
+    'email': 1,
+    'role': 1,
+    'isVerified': 1,
+    'createdAt': 1,
+    'subscription.status': 1,
+    'subscription.planId': 1,
+    'subscription.startDate': 1,
+    'subscription.endDate': 1,
+    'villages': 1,
+    'settings': 1
+}
+
 
 @api_bp.route('/user/profile', methods=['GET'])
 @api_error_handler
@@ -38,8 +84,7 @@ api_bp = Blueprint('api', __name__, url_prefix='/api')
 def get_user_profile():
     """API endpoint to get user profile data."""
     # Get user data
-    user_model = User()
-    user = user_model.get_user_by_id(session['user_id'])
+    user = user_model.get_user_by_id(session['user_id'], USER_PROFILE_PROJECTION)
     
     if not user:
         return jsonify({
@@ -57,17 +102,9 @@ def get_user_profile():
             'startDate': user['subscription'].get('startDate'),
             'endDate': user['subscription'].get('endDate')
         },
-        'settings': {
-            'notification': user['settings'].get('notification', True),
-            'autoRenew': user['settings'].get('autoRenew', False),
-            'autoFarm': user['settings'].get('autoFarm', False),
-            'trainer': user['settings'].get('trainer', False)
-        },
-        'travianCredentials': {
-            'username': user['travianCredentials'].get('username', ''),
-            'server': user['travianCredentials'].get('server', ''),
-            'tribe': user['travianCredentials'].get('tribe', '')
-        },
+        'settings': {**_DEFAULT_SETTINGS, **user['settings']},
+        # The projection already limits credentials to the public fields
+        'travianCredentials': {**_DEFAULT_CREDENTIALS, **user['travianCredentials']},
         'villages': user['villages']
     }
     
@@ -82,20 +119,31 @@ def get_user_profile():
 @login_required
 def get_user_villages():
     """API endpoint to get user villages."""
-    # Get user data
-    user_model = User()
-    user = user_model.get_user_by_id(session['user_id'])
-    
-    if not user:
+    # One document per village; preserveNullAndEmptyArrays keeps a single
+    # village-less row for users without villages, so no rows means no user
+    cursor = user_model.collection.aggregate([
+        {'$match': {'_id': get_current_user_oid()}},
+        {'$project': {'_id': 0, 'villages': 1}},
+        {'$unwind': {'path': '$villages', 'preserveNullAndEmptyArrays': True}}
+    ])
+    
+    first = next(cursor, None)
+    if first is None:
         return jsonify({
             'success': False,
             'message': 'User not found'
         }), 404
     
-    return jsonify({
-        'success': True,
-        'data': user['villages']
-    })
+    def generate():
+        # Stream the array element by element instead of encoding it whole
+        yield '{"success":true,"data":['
+        if 'villages' in first:
+            yield current_app.json.dumps(first['villages'])
+            for row in cursor:
+                yield ',' + current_app.json.dumps(row['villages'])
+        yield ']}'
+    
+    return Response(stream_with_context(generate()), mimetype='application/json')
 
 
 @api_bp.route('/user/villages/update', methods=['POST'])
@@ -104,8 +152,7 @@ def get_user_villages():
 def update_user_villages():
     """API endpoint to update user villages."""
     # Get user data
-    user_model = User()
-    user = user_model.get_user_by_id(session['user_id'])
+    user = get_current_user()
     
     if not user:
         return jsonify({
@@ -114,16 +161,13 @@ def update_user_villages():
         }), 404
     
     # Get subscription plan
-    plan_model = SubscriptionPlan()
-    plan = None
-    if user['subscription']['planId']:
-        plan = plan_model.get_plan_by_id(user['subscription']['planId'])
+    plan = get_current_plan()
     
     # Check villages limit
     villages_limit = plan['features']['maxVillages'] if plan else 0
     
-    # Get request data
-    data = request.get_json()
+    # Get request data; the body is read once, so skip caching the parsed copy
+    data = request.get_json(cache=False)
     villages = data.get('villages', [])
     
     if len(villages) > villages_limit:
@@ -134,6 +178,7 @@ def update_user_villages():
     
     # Update user villages
     if user_model.update_villages(session['user_id'], villages):
+        forget_current_user()
         logger.info(f"User '{user['username']}' updated villages")
         return jsonify({
             'success': True,
@@ -153,73 +198,51 @@ def update_user_villages():
 @login_required
 def update_user_settings():
     """API endpoint to update user settings."""
-    # Get user data
-    user_model = User()
-    user = user_model.get_user_by_id(session['user_id'])
-    
-    if not user:
-        return jsonify({
-            'success': False,
-            'message': 'User not found'
-        }), 404
-    
     # Get request data
     data = request.get_json()
     settings = data.get('settings', {})
     
-    # Validate settings
-    if 'autoFarm' in settings and settings['autoFarm']:
-        # Check if user has auto-farm in subscription
-        plan_model = SubscriptionPlan()
-        plan = None
-        if user['subscription']['planId']:
-            plan = plan_model.get_plan_by_id(user['subscription']['planId'])
-        
-        if not plan or not plan['features'].get('autoFarm', False):
-            return jsonify({
-                'success': False,
-                'message': 'Auto-Farm is not included in your subscription plan'
-            }), 400
-    
-    if 'trainer' in settings and settings['trainer']:
-        # Check if user has trainer in subscription
-        plan_model = SubscriptionPlan()
-        plan = None
-        if user['subscription']['planId']:
-            plan = plan_model.get_plan_by_id(user['subscription']['planId'])
-        
-        if not plan or not plan['features'].get('trainer', False):
-            return jsonify({
-                'success': False,
-                'message': 'Troop Trainer is not included in your subscription plan'
-            }), 400
-    
-    # Update user settings
-    update_data = {
-        'settings': {
-            # Preserve existing settings
-            'notification': user['settings'].get('notification', True),
-            'autoRenew': user['settings'].get('autoRenew', False),
-            'autoFarm': user['settings'].get('autoFarm', False),
-            'trainer': user['settings'].get('trainer', False),
-            # Update with new settings
-            **settings
-        }
-    }
-    
-    if user_model.update_user(session['user_id'], update_data):
-        logger.info(f"User '{user['username']}' updated settings")
+    # Validate settings: enabling a gated feature requires it in the plan
+    for setting_key, feature_key, message in _GATED_FEATURES:
+        if settings.get(setting_key):
+            plan = get_current_plan()
+            if not plan or not plan['features'].get(feature_key, False):
+                return jsonify({
+                    'success': False,
+                    'message': message
+                }), 400
+    
+    # Set each known setting by its dotted path so the server merges it into the
+    # stored settings; unknown keys are ignored
+    update = {f'settings.{key}': value for key, value in settings.items()
+              if key in USER_SETTING_KEYS}
+    if not update:
         return jsonify({
-            'success': True,
-            'message': 'Settings updated successfully',
-            'data': update_data['settings']
-        })
-    else:
-        logger.warning(f"Failed to update settings for user '{user['username']}'")
+            'success': False,
+            'message': 'No valid settings provided'
+        }), 400
+    update['updatedAt'] = datetime.utcnow()
+    
+    user = user_model.collection.find_one_and_update(
+        {'_id': get_current_user_oid()},
+        {'$set': update},
+        projection={'settings': 1},
+        return_document=ReturnDocument.AFTER
+    )
+    
+    if not user:
         return jsonify({
             'success': False,
-            'message': 'Failed to update settings'
-        }), 500
+            'message': 'User not found'
+        }), 404
+    
+    forget_current_user()
+    logger.info(f"User '{session.get('username')}' updated settings")
+    return jsonify({
+        'success': True,
+        'message': 'Settings updated successfully',
+        'data': {**_DEFAULT_SETTINGS, **user['settings']}
+    })
 
 
 @api_bp.route('/user/travian-credentials/update', methods=['POST'])
@@ -227,42 +250,35 @@ def update_user_settings():
 @login_required
 def update_travian_credentials():
     """API endpoint to update travian credentials."""
-    # Get user data
-    user_model = User()
-    user = user_model.get_user_by_id(session['user_id'])
-    
-    if not user:
-        return jsonify({
-            'success': False,
-            'message': 'User not found'
-        }), 404
-    
     # Get request data
     data = request.get_json()
     travian_credentials = data.get('travianCredentials', {})
     
-    # Check if password field is masked
+    # Set only the editable fields, one by one, so server-managed fields such as
+    # is_gold_member are kept; a masked password means "keep the stored one"
+    update = {f'travianCredentials.{key}': travian_credentials[key]
+              for key in TRAVIAN_CREDENTIAL_FIELDS if key in travian_credentials}
     if travian_credentials.get('password') == '********':
-        # Keep existing password
-        travian_credentials['password'] = user['travianCredentials'].get('password', '')
+        del update['travianCredentials.password']
+    update['updatedAt'] = datetime.utcnow()
     
-    # Update travian credentials
-    update_data = {
-        'travianCredentials': travian_credentials
-    }
+    result = user_model.collection.update_one(
+        {'_id': get_current_user_oid()},
+        {'$set': update}
+    )
     
-    if user_model.update_user(session['user_id'], update_data):
-        logger.info(f"User '{user['username']}' updated Travian credentials")
-        return jsonify({
-            'success': True,
-            'message': 'Travian credentials updated successfully'
-        })
-    else:
-        logger.warning(f"Failed to update Travian credentials for user '{user['username']}'")
+    if result.matched_count == 0:
         return jsonify({
             'success': False,
-            'message': 'Failed to update Travian credentials'
-        }), 500
+            'message': 'User not found'
+        }), 404
+    
+    forget_current_user()
+    logger.info(f"User '{session.get('username')}' updated Travian credentials")
+    return jsonify({
+        'success': True,
+        'message': 'Travian credentials updated successfully'
+    })
 
 
 @api_bp.route('/subscription/create-order', methods=['POST'])
@@ -282,8 +298,7 @@ def create_subscription_order_route():
         return redirect(url_for('user.subscription'))
     
     # Check if this is a free plan
-    plan_model = SubscriptionPlan()
-    plan = plan_model.get_plan_by_id(plan_id)
+    plan = plan_model.get_plan_by_id_cached(plan_id)
     
     if not plan:
         flash('Plan not found', 'danger')
@@ -293,81 +308,39 @@ def create_subscription_order_route():
     if plan['price']['monthly'] == 0 and plan['price']['yearly'] == 0:
         logger.info(f"Processing free plan activation for plan: {plan_id}, user: {user_id}")
         
-        # Get user data
-        user_model = User()
-        user = user_model.get_user_by_id(user_id)
-        
-        if not user:
-            logger.error(f"User not found for free plan activation: {user_id}")
-            flash('User not found', 'danger')
-            return redirect(url_for('user.subscription'))
-        
         # Calculate subscription dates
         start_date = datetime.utcnow()
         
         # For free plans, give a long subscription period (1 year)
         end_date = start_date + timedelta(days=365)
         
-        # Update subscription data
-        subscription_data = {
-            'subscription': {
-                'planId': ObjectId(plan_id),
-                'status': 'active',
-                'startDate': start_date,
-                'endDate': end_date,
-                'billingPeriod': 'yearly',  # Free plans are considered yearly
-                # Keep payment history if exists, otherwise initialize
-                'paymentHistory': user['subscription'].get('paymentHistory', [])
-            }
-        }
-        
-        # Update user subscription
-        success = False
-        if user_model.update_user(user_id, subscription_data):
-            # Log the activity
-            try:
-                activity_model = ActivityLog()
-                activity_model.log_activity(
-                    user_id=user_id,
-                    activity_type='subscription-activated',
-                    details=f"Free {plan['name']} plan activated",
-                    status='success',
-                    data={
-                        'plan_id': str(plan['_id']),
-                        'plan_name': plan['name'],
-                        'start_date': start_date.isoformat(),
-                        'end_date': end_date.isoformat()
-                    }
-                )
-            except Exception as e:
-                logger.error(f"Error logging activity: {e}")
+        # Subscription and the plan's feature settings go out in a single update;
+        # free plans are considered yearly
+        updated = user_model.activate_subscription(user_id, plan, start_date, end_date, 'yearly')
+        if updated:
+            forget_current_user()
             
-            # Update user settings based on plan features
-            try:
-                settings_update = {
-                    'settings': user['settings'].copy()  # Start with existing settings
+            # Log the activity
+            activity_queue.log_activity(
+                user_id=user_id,
+                activity_type='subscription-activated',
+                details=f"Free {plan['name']} plan activated",
+                status='success',
+                data={
+                    'plan_id': str(plan['_id']),
+                    'plan_name': plan['name'],
+                    'start_date': start_date.isoformat(),
+                    'end_date': end_date.isoformat()
                 }
-                
-                # Enable features included in the plan
-                settings_update['settings']['autoFarm'] = plan['features'].get('autoFarm', False)
-                settings_update['settings']['trainer'] = plan['features'].get('trainer', False)
-                
-                if plan['features'].get('notification', False):
-                    settings_update['settings']['notification'] = True
-                
-                # Update user settings
-                user_model.update_user(user_id, settings_update)
-                logger.info(f"Updated user settings based on free plan features for user {user_id}")
-                success = True
-            except Exception as e:
-                logger.error(f"Failed to update user settings for free plan: {e}")
-                
-            if success:
-                flash(f'You have successfully activated the free {plan["name"]} plan!', 'success')
-            else:
-                flash('Failed to activate free plan', 'danger')
-                
-            return redirect(url_for('user.subscription'))
+            )
+            
+            logger.info(f"Activated free plan with its feature settings for user {user_id}")
+            flash(f'You have successfully activated the free {plan["name"]} plan!', 'success')
+        else:
+            # No match: the user already has an active subscription (or is gone)
+            flash('You already have an active subscription', 'warning')
+        
+        return redirect(url_for('user.subscription'))
     
     # Generate success and cancel URLs
     base_url = request.host_url.rstrip('/')
@@ -385,16 +358,12 @@ def create_subscription_order_route():
     
     if success and approval_url:
         # Log the activity
-        try:
-            activity_model = ActivityLog()
-            activity_model.log_activity(
-                user_id=user_id,
-                activity_type='subscription-order',
-                details=f"Created subscription order with {billing_period} billing",
-                status='pending'
-            )
-        except Exception as e:
-            logger.error(f"Error logging activity: {e}")
+        activity_queue.log_activity(
+            user_id=user_id,
+            activity_type='subscription-order',
+            details=f"Created subscription order with {billing_period} billing",
+            status='pending'
+        )
         
         # Redirect to PayPal for payment
         return redirect(approval_url)
@@ -407,67 +376,52 @@ def create_subscription_order_route():
 @login_required
 def cancel_subscription():
     """Form-based endpoint to cancel a subscription."""
-    # Get user data
-    user_model = User()
-    user = user_model.get_user_by_id(session['user_id'])
-    
-    if not user:
-        flash('User not found', 'danger')
+    # Cancel in one atomic step: the filter only matches an active subscription,
+    # and the pre-update document tells us which plan was cancelled
+    try:
+        user = user_model.collection.find_one_and_update(
+            {'_id': get_current_user_oid(), 'subscription.status': 'active'},
+            {'$set': {
+                'subscription.status': 'cancelled',
+                'updatedAt': datetime.utcnow()
+            }},
+            projection={'subscription.planId': 1},
+            return_document=ReturnDocument.BEFORE
+        )
+    except Exception as e:
+        logger.error(f"Error cancelling subscription: {e}")
+        flash('An error occurred while cancelling your subscription. Please try again or contact support.', 'danger')
         return redirect(url_for('user.subscription'))
     
-    # Check if user has an active subscription
-    if user['subscription']['status'] != 'active':
+    # No match means the user is gone or has no active subscription
+    if not user:
         flash('No active subscription to cancel', 'warning')
         return redirect(url_for('user.subscription'))
     
-    # Get the current subscription plan to provide better messaging
-    plan_model = SubscriptionPlan()
-    plan_name = "subscription"
+    forget_current_user()
     
-    if user['subscription'].get('planId'):
-        plan = plan_model.get_plan_by_id(user['subscription'].get('planId'))
+    # Get the cancelled subscription plan to provide better messaging
+    plan_name = "subscription"
+    plan_id = user['subscription'].get('planId')
+    if plan_id:
+        plan = plan_model.get_plan_by_id_cached(plan_id)
         if plan:
             plan_name = plan['name']
     
-    # Update subscription status directly since update_subscription_status doesn't exist
-    try:
-        result = user_model.collection.update_one(
-            {'_id': ObjectId(session['user_id'])},
-            {'$set': {
-                'subscription.status': 'cancelled',
-                'updatedAt': datetime.utcnow()
-            }}
-        )
-        
-        success = result.modified_count > 0
-        
-        if success:
-            # Log the activity
-            try:
-                activity_model = ActivityLog()
-                activity_model.log_activity(
-                    user_id=session['user_id'],
-                    activity_type='subscription-cancel',
-                    details=f'Cancelled {plan_name} subscription',
-                    status='success'
-                )
-            except Exception as e:
-                logger.error(f"Error logging activity: {e}")
-            
-            flash(f'Your {plan_name} subscription has been cancelled. You will continue to have access until the end of your current billing period.', 'success')
-        else:
-            flash('Failed to cancel subscription. Please try again or contact support.', 'danger')
-            
-    except Exception as e:
-        logger.error(f"Error cancelling subscription: {e}")
-        flash('An error occurred while cancelling your subscription. Please try again or contact support.', 'danger')
+    # Log the activity
+    activity_queue.log_activity(
+        user_id=session['user_id'],
+        activity_type='subscription-cancel',
+        details=f'Cancelled {plan_name} subscription',
+        status='success'
+    )
     
+    flash(f'Your {plan_name} subscription has been cancelled. You will continue to have access until the end of your current billing period.', 'success')
     return redirect(url_for('user.subscription'))
 
 def update_transaction_status(transaction_id, status):
     """API endpoint to update transaction status."""
     # Get transaction details
-    transaction_model = Transaction()
     tx = transaction_model.get_transaction(transaction_id)
     
     if not tx:
@@ -497,7 +451,7 @@ def update_transaction_status(transaction_id, status):
         from payment.paypal import process_successful_payment
         
         # Call process_successful_payment with only the paymentId
-        process_result = process_successful_payment(tx["paymentId"])
+        process_result = process_successful_payment(tx["paymentId"], reprocess=True)
         
         if process_result:
             logger.info(f"Successfully processed payment for transaction {transaction_id}")
@@ -516,9 +470,6 @@ def update_transaction_status(transaction_id, status):
     
     # For change from 'completed' to something else - handle subscription accordingly
     if tx['status'] == 'completed' and status != 'completed':
-        # Get user model and update subscription status
-        user_model = User()
-        
         # Update subscription status to inactive
         user_model.update_subscription_status(str(tx["userId"]), "inactive")
         
@@ -527,7 +478,6 @@ def update_transaction_status(transaction_id, status):
     # Update transaction status
     if transaction_model.update_transaction_status(transaction_id, status):
         # Log the activity
-        activity_model = ActivityLog()
         activity_model.log_activity(
             user_id=str(tx['userId']),
             activity_type='transaction-status-update',
@@ -587,11 +537,8 @@ def admin_refresh_stats():
     """API endpoint to refresh admin dashboard statistics."""
     # In a real implementation, this would recompute the statistics
     
-    # Get current user for logging
-    user_model = User()
-    current_user = user_model.get_user_by_id(session['user_id'])
-    
-    logger.info(f"Admin '{current_user['username']}' refreshed dashboard statistics")
+    # The admin's username is stored in the session at login
+    logger.info(f"Admin '{session.get('username', '?')}' refreshed dashboard statistics")
     
     return jsonify({
         'success': True,
@@ -603,12 +550,8 @@ def admin_refresh_stats():
 @admin_required
 def admin_get_user(user_id):
     """API endpoint to get user details for admin."""
-    # Get current user for logging
-    user_model = User()
-    current_user = user_model.get_user_by_id(session['user_id'])
-    
     # Get user to view
-    user = user_model.get_user_by_id(user_id)
+    user = user_model.get_user_by_id(user_id, ADMIN_USER_DETAIL_PROJECTION)
     
     if not user:
         return jsonify({
@@ -617,41 +560,34 @@ def admin_get_user(user_id):
         }), 404
     
     # Get subscription data
-    subscription_model = SubscriptionPlan()
     plan_name = "None"
-    if user['subscription']['planId']:
-        plan = subscription_model.get_plan_by_id(user['subscription']['planId'])
+    if user['subscription'].get('planId'):
+        plan = plan_model.get_plan_by_id_cached(user['subscription']['planId'])
         if plan:
             plan_name = plan['name']
     
-    # Format dates for JSON serialization
-    start_date = None
-    end_date = None
-    if user['subscription'].get('startDate'):
-        start_date = user['subscription']['startDate'].strftime('%Y-%m-%d') if isinstance(user['subscription']['startDate'], datetime) else None
-    if user['subscription'].get('endDate'):
-        end_date = user['subscription']['endDate'].strftime('%Y-%m-%d') if isinstance(user['subscription']['endDate'], datetime) else None
-    
-    # Prepare user data
+    # Prepare user data; the app's msgspec JSON provider encodes datetimes
+    # (ISO 8601) and ObjectIds natively, so they are passed through as-is
+    subscription = user['subscription']
     user_data = {
-        'id': str(user['_id']),
+        'id': user['_id'],
         'username': user['username'],
         'email': user['email'],
         'role': user['role'],
         'status': 'active' if user.get('isVerified', False) else 'inactive',
-        'createdAt': user['createdAt'].strftime('%Y-%m-%d %H:%M:%S') if isinstance(user['createdAt'], datetime) else str(user['createdAt']),
+        'createdAt': user['createdAt'],
         'subscription': {
-            'status': user['subscription']['status'],
-            'planId': str(user['subscription']['planId']) if user['subscription'].get('planId') else None,
+            'status': subscription['status'],
+            'planId': subscription.get('planId'),
             'planName': plan_name,
-            'startDate': start_date,
-            'endDate': end_date
+            'startDate': subscription.get('startDate'),
+            'endDate': subscription.get('endDate')
         },
         'villages': user['villages'],
         'settings': user['settings']
     }
     
-    logger.info(f"Admin '{current_user['username']}' viewed user '{user['username']}'")
+    logger.info(f"Admin '{session.get('username', '?')}' viewed user '{user['username']}'")
     
     return jsonify({
         'success': True,
@@ -675,9 +611,8 @@ def delete_user_account():
         # Get user ID
         user_id = session['user_id']
         
-        # Get user model
-        user_model = User()
-        user = user_model.get_user_by_id(user_id)
+        # Get user data
+        user = get_current_user()
         
         if not user:
             # Handle case when user isn't found
@@ -686,8 +621,6 @@ def delete_user_account():
         
         # First, log the deletion request
         try:
-            from database.models.activity_log import ActivityLog
-            activity_model = ActivityLog()
             activity_model.log_activity(
                 user_id=user_id,
                 activity_type='account-deletion',
@@ -698,30 +631,7 @@ def delete_user_account():
             logger.error(f"Error logging deletion activity: {e}")
         
         # Delete user and all associated data
-        success = False
-        
-        # Check if delete_user method exists
-        if hasattr(user_model, 'delete_user'):
-            success = user_model.delete_user(user_id)
-        else:
-            # Implement delete functionality if method doesn't exist
-            try:
-                # Delete user
-                result = user_model.collection.delete_one({"_id": ObjectId(user_id)})
-                
-                if result.deleted_count > 0:
-                    # Delete associated data (activities, etc.)
-                    try:
-                        from database.models.activity_log import ActivityLog
-                        activity_model = ActivityLog()
-                        activity_model.delete_user_logs(user_id)
-                    except Exception as e:
-                        logger.error(f"Error deleting user activities: {e}")
-                    
-                    success = True
-            except Exception as e:
-                logger.error(f"Error deleting user: {e}")
-                success = False
+        success = user_model.delete_user(user_id)
         
         # Clear session regardless of success
         session.clear()
@@ -752,12 +662,10 @@ def delete_user_account():
 @api_error_handler
 def paypal_webhook():
     """Webhook endpoint for PayPal payment notifications."""
-    # Import PayPal webhook function
-    from payment.paypal import handle_webhook_event, verify_webhook_signature
-    
-    # Verify webhook signature
-    if not verify_webhook_signature(request.data, request.headers):
-        logger.warning("Invalid PayPal webhook signature")
+    # Reject obviously forged requests here; the signature check itself calls
+    # PayPal's API, so it runs in the background with the event handling
+    if not precheck_webhook_headers(request.headers):
+        logger.warning("Invalid PayPal webhook headers")
         return jsonify({
             'success': False,
             'message': 'Invalid webhook signature'
@@ -776,19 +684,32 @@ def paypal_webhook():
             'message': 'Missing event type'
         }), 400
     
-    # Handle webhook event
+    # The task outlives the request, so it gets its own copies of body and headers
+    run_in_background(_process_webhook, event_type, event_data, request.get_data(), Headers(request.headers))
+    
+    return jsonify({
+        'success': True,
+        'message': 'Webhook accepted for processing'
+    }), 202
+
+def _process_webhook(event_type, event_data, body, headers):
+    """
+    Verify and handle a PayPal webhook event (background task).
+    
+    Args:
+        event_type (str): Event type
+        event_data (dict): Event data
+        body (bytes): Raw webhook body
+        headers (Headers): Request headers
+    """
+    if not verify_webhook_signature(body, headers):
+        logger.warning(f"Invalid PayPal webhook signature for event: {event_type}")
+        return
+    
     if handle_webhook_event(event_type, event_data):
         logger.info(f"Successfully processed PayPal webhook event: {event_type}")
-        return jsonify({
-            'success': True,
-            'message': 'Webhook processed successfully'
-        })
     else:
         logger.warning(f"Failed to process PayPal webhook event: {event_type}")
-        return jsonify({
-            'success': False,
-            'message': 'Failed to process webhook event'
-        }), 500
 
 
 
@@ -830,10 +751,6 @@ from flask import request, jsonify, session, current_app
 from bson import ObjectId
 
 from web.utils.decorators import login_required, api_error_handler
-from database.models.user import User
-from database.models.subscription import SubscriptionPlan
-from database.models.transaction import Transaction
-from database.models.activity_log import ActivityLog
 from payment.paypal import create_subscription_order, process_successful_payment
 
 # Initialize logger
@@ -866,7 +783,6 @@ def create_subscription_order_api():
         }), 400
     
     # Get plan details
-    plan_model = SubscriptionPlan()
     plan = plan_model.get_plan_by_id(plan_id)
     
     if not plan:
@@ -892,7 +808,6 @@ def create_subscription_order_api():
     if success and approval_url:
         # Log the activity
         try:
-            activity_model = ActivityLog()
             activity_model.log_activity(
                 user_id=user_id,
                 activity_type='subscription-order',
@@ -948,7 +863,6 @@ def process_payment_api():
 def cancel_subscription_api():
     """API endpoint to cancel a subscription."""
     # Get user data
-    user_model = User()
     user = user_model.get_user_by_id(session.get('user_id'))
     
     if not user:
@@ -965,7 +879,6 @@ def cancel_subscription_api():
         }), 400
     
     # Get the current subscription plan for better messaging
-    plan_model = SubscriptionPlan()
     plan_name = "subscription"
     
     if user['subscription'].get('planId'):
@@ -992,7 +905,6 @@ def cancel_subscription_api():
         if success:
             # Log the activity
             try:
-                activity_model = ActivityLog()
                 activity_model.log_activity(
                     user_id=session.get('user_id'),
                     activity_type='subscription-cancel',
@@ -1023,7 +935,6 @@ def cancel_subscription_api():
 def get_subscription_status():
     """API endpoint to get user's subscription status."""
     # Get user data
-    user_model = User()
     user = user_model.get_user_by_id(session.get('user_id'))
     
     if not user:
@@ -1033,20 +944,21 @@ def get_subscription_status():
         }), 404
     
     # Get subscription plan
-    plan_model = SubscriptionPlan()
     current_plan = None
     if user['subscription']['planId']:
-        current_plan = plan_model.get_plan_by_id(str(user['subscription']['planId']))
+        current_plan = plan_model.get_plan_by_id_cached(user['subscription']['planId'])
     
     # Get user's transaction history
-    transaction_model = Transaction()
     transactions = transaction_model.get_user_transactions(session.get('user_id'), limit=5)
     
+    # Load every plan the transactions refer to in one query
+    plans_by_id = plan_model.get_plans_by_ids(tx['planId'] for tx in transactions if tx.get('planId'))
+    
     # Format transaction history for display
     transaction_history = []
     for tx in transactions:
         # Get plan info
-        plan_info = plan_model.get_plan_by_id(str(tx.get('planId'))) if tx.get('planId') else None
+        plan_info = plans_by_id.get(str(tx.get('planId'))) if tx.get('planId') else None
         plan_name = plan_info['name'] if plan_info else 'Unknown Plan'
         
         # Format dates properly for display
@@ -1101,7 +1013,6 @@ def update_auto_renew():
     auto_renew = data.get('auto_renew', False)
     
     # Get user data
-    user_model = User()
     user = user_model.get_user_by_id(session.get('user_id'))
     
     if not user:
@@ -1117,7 +1028,6 @@ def update_auto_renew():
     if user_model.update_user(session.get('user_id'), {'settings': settings}):
         # Log the activity
         try:
-            activity_model = ActivityLog()
             activity_model.log_activity(
                 user_id=session.get('user_id'),
                 activity_type='settings-update',
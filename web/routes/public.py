@@ -5,7 +5,7 @@ This module defines the blueprint for public-facing routes.
 import logging
 import os
 from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
-from database.models.subscription import SubscriptionPlan
+from database.models import plan_model
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -19,7 +19,6 @@ def index():
     """Landing page route."""
     try:
         # Get subscription plans for pricing section
-        plan_model = SubscriptionPlan()
         plans = plan_model.list_plans()
         
         # Check if base template exists
@@ -52,7 +51,6 @@ def features():
 def pricing():
     """Pricing page route."""
     # Get subscription plans
-    plan_model = SubscriptionPlan()
     plans = plan_model.list_plans()
     
     # Render pricing template
@@ -4,8 +4,7 @@ API endpoint for verifying Travian connection.
 import logging
 from flask import Blueprint, request, jsonify, session
 from web.utils.decorators import login_required, api_error_handler
-from database.models.user import User
-from database.models.activity_log import ActivityLog
+from database.models import user_model, activity_model
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -19,7 +18,6 @@ travian_api_bp = Blueprint('travian_api', __name__, url_prefix='/api/user/travia
 def verify_travian_connection():
     """API endpoint to verify Travian account connection."""
     # Get user data
-    user_model = User()
     user = user_model.get_user_by_id(session['user_id'])
     
     if not user:
@@ -69,7 +67,6 @@ def verify_travian_connection():
             
             # Log successful connection
             try:
-                activity_model = ActivityLog()
                 activity_model.log_activity(
                     user_id=session['user_id'],
                     activity_type='travian-connection',
@@ -91,7 +88,6 @@ def verify_travian_connection():
         else:
             # Log failed connection
             try:
-                activity_model = ActivityLog()
                 activity_model.log_activity(
                     user_id=session['user_id'],
                     activity_type='travian-connection',
@@ -111,7 +107,6 @@ def verify_travian_connection():
         
         # Log error
         try:
-            activity_model = ActivityLog()
             activity_model.log_activity(
                 user_id=session['user_id'],
                 activity_type='travian-connection',
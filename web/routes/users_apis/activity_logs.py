@@ -11,13 +11,19 @@ from flask import (
     url_for, request, jsonify, Response, current_app
 )
 
+from web.utils.helpers import get_current_user
 from web.utils.decorators import login_required, api_error_handler
-from database.models.user import User
-from database.models.activity_log import ActivityLog
+from database.models import activity_model
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
+# Column headers for the CSV export
+CSV_EXPORT_FIELDS = ('timestamp', 'activity_type', 'details', 'status', 'village')
+
+# Rows per getMore when reading logs for export
+EXPORT_BATCH_SIZE = 5000
+
 def register_routes(user_bp):
     """Register activity logs routes with the user blueprint."""
     # Attach routes to the blueprint
@@ -28,8 +34,7 @@ def register_routes(user_bp):
 def activity_logs():
     """Activity logs route."""
     # Get user data
-    user_model = User()
-    user = user_model.get_user_by_id(session['user_id'])
+    user = get_current_user()
     
     if not user:
         # Flash error message
@@ -56,7 +61,6 @@ def activity_logs():
         filter_query["village"] = village
     
     # Get activity logs from database
-    activity_model = ActivityLog()
     
     # Get paginated logs
     logs_data = activity_model.get_user_logs(
@@ -172,14 +176,17 @@ def export_activity_logs():
             filter_query["timestamp"]["$lte"] = end_date
     
     # Get activity logs from database
-    activity_model = ActivityLog()
     
     # Get all logs that match the filter (no pagination)
-    all_logs = list(activity_model.collection.find(filter_query).sort("timestamp", -1))
+    logs_cursor = activity_model.collection.find(filter_query).sort("timestamp", -1).batch_size(EXPORT_BATCH_SIZE)
+    
+    # CSV rows are written straight from the documents
+    if export_format == 'csv':
+        return export_as_csv(logs_cursor)
     
-    # Format logs for export
+    # Format logs for JSON export
     formatted_logs = []
-    for log in all_logs:
+    for log in logs_cursor:
         formatted_logs.append({
             'timestamp': log.get('timestamp').strftime('%Y-%m-%d %H:%M:%S') if log.get('timestamp') else 'N/A',
             'activity_type': log.get('activityType', 'Unknown'),
@@ -189,37 +196,35 @@ def export_activity_logs():
             'data': log.get('data', {})
         })
     
-    # Export as CSV or JSON
-    if export_format == 'csv':
-        return export_as_csv(formatted_logs)
-    else:
-        return export_as_json(formatted_logs)
+    return export_as_json(formatted_logs)
 
 def export_as_csv(logs):
     """
     Export logs as CSV file.
     
     Args:
-        logs (list): List of log dictionaries
+        logs (iterable): Activity log documents
         
     Returns:
         Response: Flask response with CSV file
     """
     # Create CSV file in memory
     output = io.StringIO()
-    fieldnames = ['timestamp', 'activity_type', 'details', 'status', 'village']
-    
-    # Create CSV writer
-    writer = csv.DictWriter(output, fieldnames=fieldnames)
+    writer = csv.writer(output)
     
     # Write header
-    writer.writeheader()
+    writer.writerow(CSV_EXPORT_FIELDS)
     
-    # Write logs
+    # Write logs as positional rows in CSV_EXPORT_FIELDS order
     for log in logs:
-        # Only include the specified fields
-        row = {field: log.get(field, '') for field in fieldnames}
-        writer.writerow(row)
+        timestamp = log.get('timestamp')
+        writer.writerow((
+            timestamp.strftime('%Y-%m-%d %H:%M:%S') if timestamp else 'N/A',
+            log.get('activityType', 'Unknown'),
+            log.get('details', 'No details'),
+            log.get('status', 'Unknown'),
+            log.get('village', 'N/A')
+        ))
     
     # Create response
     response = Response(
@@ -6,9 +6,9 @@ from flask import (
     render_template, flash, session, redirect, url_for
 )
 
+from web.utils.helpers import get_current_user, get_current_plan
 from web.utils.decorators import login_required
-from database.models.user import User
-from database.models.subscription import SubscriptionPlan
+from database.models import activity_model
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -22,8 +22,7 @@ def register_routes(user_bp):
 def dashboard():
     """User dashboard route."""
     # Get user data
-    user_model = User()
-    user = user_model.get_user_by_id(session['user_id'])
+    user = get_current_user()
     
     if not user:
         # Flash error message
@@ -34,14 +33,9 @@ def dashboard():
         return redirect(url_for('auth.login'))
     
     # Get subscription plan
-    plan_model = SubscriptionPlan()
-    plan = None
-    if user['subscription']['planId']:
-        plan = plan_model.get_plan_by_id(user['subscription']['planId'])
+    plan = get_current_plan()
     
     # Get user activity logs for auto-farm and trainer
-    from database.models.activity_log import ActivityLog
-    activity_model = ActivityLog()
     
     # Get latest auto-farm activity
     auto_farm_log = activity_model.get_latest_user_activity(
@@ -8,11 +8,11 @@ from flask import (
     url_for, flash, session, current_app
 )
 
+from web.utils import activity_queue
+from web.utils.helpers import get_current_user, get_current_plan
 from web.utils.decorators import login_required
-from database.models.user import User
-from database.models.subscription import SubscriptionPlan
-from database.models.activity_log import ActivityLog
 from auth.password_reset import change_password
+from database.models import user_model, activity_model
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -32,8 +32,7 @@ def register_routes(user_bp):
 def profile():
     """User profile route."""
     # Get user data
-    user_model = User()
-    user = user_model.get_user_by_id(session['user_id'])
+    user = get_current_user()
     
     if not user:
         # Flash error message
@@ -66,8 +65,7 @@ def profile():
             # Update user in database
             if user_model.update_user(session['user_id'], update_data):
                 # Log the activity
-                activity_model = ActivityLog()
-                activity_model.log_activity(
+                activity_queue.log_activity(
                     user_id=session['user_id'],
                     activity_type='profile-update',
                     details='Profile information updated',
@@ -99,8 +97,7 @@ def profile():
             # Flash appropriate message
             if success:
                 # Log the activity
-                activity_model = ActivityLog()
-                activity_model.log_activity(
+                activity_queue.log_activity(
                     user_id=session['user_id'],
                     activity_type='password-change',
                     details='Password changed successfully',
@@ -114,16 +111,10 @@ def profile():
                 logger.warning(f"Failed to change password for user '{user['username']}': {message}")
     
     # Get current subscription plan if available
-    plan_model = SubscriptionPlan()
-    current_plan = None
-    
-    if user['subscription']['planId']:
-        plan = plan_model.get_plan_by_id(user['subscription']['planId'])
-        if plan:
-            current_plan = plan['name']
+    plan = get_current_plan()
+    current_plan = plan['name'] if plan else None
     
     # Get user activity statistics
-    activity_model = ActivityLog()
     
     # Count activities for the user
     activity_count = activity_model.count_user_activities(user_id=session['user_id'])
@@ -182,8 +173,7 @@ def profile():
 def update_profile_api():
     """API endpoint to update user profile."""
     # Get user data
-    user_model = User()
-    user = user_model.get_user_by_id(session['user_id'])
+    user = get_current_user()
     
     if not user:
         from flask import jsonify
@@ -217,8 +207,7 @@ def update_profile_api():
         
         if user_model.update_user(session['user_id'], update_data):
             # Log the activity
-            activity_model = ActivityLog()
-            activity_model.log_activity(
+            activity_queue.log_activity(
                 user_id=session['user_id'],
                 activity_type='profile-update',
                 details='Profile settings updated via API',
@@ -249,8 +238,7 @@ def update_profile_api():
 def delete_account():
     """Delete user account route."""
     # Get user data
-    user_model = User()
-    user = user_model.get_user_by_id(session['user_id'])
+    user = get_current_user()
     
     if not user:
         # Flash error message
@@ -269,9 +257,9 @@ def delete_account():
             flash('Please type "delete" to confirm account deletion', 'danger')
             return redirect(url_for('user.profile'))
         
-        # Log the deletion request
+        # Log the deletion request (synchronously, so it is stored before the
+        # user's logs are deleted with the account)
         try:
-            activity_model = ActivityLog()
             activity_model.log_activity(
                 user_id=session['user_id'],
                 activity_type='account-deletion',
@@ -281,13 +269,8 @@ def delete_account():
         except Exception as e:
             logger.error(f"Error logging account deletion: {e}")
         
-        # Delete user
-        if hasattr(user_model, 'delete_user'):
-            success = user_model.delete_user(session['user_id'])
-        else:
-            # Fallback method
-            result = user_model.collection.delete_one({"_id": ObjectId(session['user_id'])})
-            success = result.deleted_count > 0
+        # Delete user and their data
+        success = user_model.delete_user(session['user_id'])
         
         # Clear session
         session.clear()
@@ -2,24 +2,44 @@
 Enhanced subscription management routes for Travian Whispers web application.
 This module provides improved handling of subscription data and payment processing.
 """
+import csv
+import io
 import logging
 from datetime import datetime, timedelta
 from flask import (
     render_template, flash, session, redirect, 
-    url_for, request, jsonify, current_app
+    url_for, request, jsonify, current_app, Response, stream_with_context
 )
 from bson import ObjectId
+from pymongo import DESCENDING
 
+from web.utils import activity_queue
+from web.utils.helpers import get_current_user
 from web.utils.decorators import login_required, api_error_handler
-from database.models.user import User
-from database.models.subscription import SubscriptionPlan
-from database.models.transaction import Transaction
-from database.models.activity_log import ActivityLog
 from payment.paypal import create_subscription_order, process_successful_payment
+from database.models import user_model, plan_model, transaction_model
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
+# Transaction fields shown in the history table and subscription stats
+TRANSACTION_HISTORY_PROJECTION = {
+    'planId': 1, 'amount': 1, 'status': 1, 'paymentMethod': 1,
+    'billingPeriod': 1, 'createdAt': 1
+}
+
+# Transaction fields written to the subscription summary CSV
+TRANSACTION_SUMMARY_PROJECTION = {
+    'amount': 1, 'status': 1, 'paymentMethod': 1, 'createdAt': 1
+}
+
+# Header lines of the subscription summary CSV (csv.writer line endings)
+SUMMARY_CSV_HEADER = 'Subscription Summary\r\nDate,Transaction ID,Amount,Status,Payment Method\r\n'
+
+# Rows per getMore for CSV exports; projected rows are small, so large batches
+# keep round trips down while memory stays bounded by one batch
+EXPORT_BATCH_SIZE = 5000
+
 def register_routes(user_bp):
     """Register subscription routes with the user blueprint."""
     # Attach routes to the blueprint
@@ -39,8 +59,7 @@ def register_routes(user_bp):
 def subscription():
     """Subscription management route."""
     # Get user data
-    user_model = User()
-    user = user_model.get_user_by_id(session['user_id'])
+    user = get_current_user()
     
     if not user:
         # Flash error message
@@ -51,23 +70,27 @@ def subscription():
         return redirect(url_for('auth.login'))
     
     # Get subscription plans
-    plan_model = SubscriptionPlan()
     plans = plan_model.list_plans()
     
+    # Index plans by ID; list_plans() returns every plan, so the current plan and
+    # each transaction's plan resolve from this dict instead of one query apiece
+    plans_by_id = {plan['_id']: plan for plan in plans}
+    
     # Get current plan
     current_plan = None
     if user['subscription']['planId']:
-        current_plan = plan_model.get_plan_by_id(str(user['subscription']['planId']))
+        current_plan = plans_by_id.get(ObjectId(str(user['subscription']['planId'])))
     
     # Get user's transaction history
-    transaction_model = Transaction()
-    transactions = transaction_model.get_user_transactions(session['user_id'])
+    transactions = transaction_model.get_user_transactions(
+        session['user_id'], projection=TRANSACTION_HISTORY_PROJECTION
+    )
     
     # Format transaction history for display
     transaction_history = []
     for tx in transactions:
         # Get plan info
-        plan_info = plan_model.get_plan_by_id(str(tx.get('planId'))) if tx.get('planId') else None
+        plan_info = plans_by_id.get(tx.get('planId')) if tx.get('planId') else None
         plan_name = plan_info['name'] if plan_info else 'Unknown Plan'
         
         # Format dates properly for display
@@ -105,8 +128,7 @@ def subscription():
                 plan['yearly_savings'] = 0
     
     # Log a view activity
-    activity_model = ActivityLog()
-    activity_model.log_activity(
+    activity_queue.log_activity(
         user_id=session['user_id'],
         activity_type='subscription-view',
         details='Viewed subscription management page',
@@ -212,17 +234,8 @@ def activate_free_plan():
         flash('Plan ID is required', 'danger')
         return redirect(url_for('user.subscription'))
     
-    # Get user data
-    user_model = User()
-    user = user_model.get_user_by_id(session['user_id'])
-    
-    if not user:
-        flash('User not found', 'danger')
-        return redirect(url_for('auth.login'))
-    
     # Get plan details to verify it's really free
-    plan_model = SubscriptionPlan()
-    plan = plan_model.get_plan_by_id(plan_id)
+    plan = plan_model.get_plan_by_id_cached(plan_id)
     
     if not plan:
         flash('Plan not found', 'danger')
@@ -239,24 +252,11 @@ def activate_free_plan():
     # For free plans, give a long subscription period (1 year)
     end_date = start_date + timedelta(days=365)
     
-    # Update subscription data
-    subscription_data = {
-        'subscription': {
-            'planId': ObjectId(plan_id),
-            'status': 'active',
-            'startDate': start_date,
-            'endDate': end_date,
-            'billingPeriod': 'yearly',  # Free plans are considered yearly
-            # Keep payment history if exists, otherwise initialize
-            'paymentHistory': user['subscription'].get('paymentHistory', [])
-        }
-    }
-    
-    # Update user subscription
-    if user_model.update_user(session['user_id'], subscription_data):
+    # Update subscription and plan feature settings in one write; free plans
+    # are considered yearly
+    if user_model.activate_subscription(session['user_id'], plan, start_date, end_date, 'yearly'):
         # Log the activity
-        activity_model = ActivityLog()
-        activity_model.log_activity(
+        activity_queue.log_activity(
             user_id=session['user_id'],
             activity_type='subscription-activated',
             details=f"Free {plan['name']} plan activated",
@@ -269,35 +269,10 @@ def activate_free_plan():
             }
         )
         
-        # Update user settings based on plan features
-        try:
-            settings_update = {
-                'settings': user['settings'].copy()  # Start with existing settings
-            }
-            
-            # Enable features included in the plan
-            if plan['features'].get('autoFarm', False):
-                settings_update['settings']['autoFarm'] = True
-            else:
-                settings_update['settings']['autoFarm'] = False
-                
-            if plan['features'].get('trainer', False):
-                settings_update['settings']['trainer'] = True
-            else:
-                settings_update['settings']['trainer'] = False
-                
-            if plan['features'].get('notification', False):
-                settings_update['settings']['notification'] = True
-            
-            # Update user settings
-            user_model.update_user(session['user_id'], settings_update)
-            logger.info(f"Updated user settings based on free plan features for user {session['user_id']}")
-        except Exception as e:
-            logger.error(f"Failed to update user settings for free plan: {e}")
-        
         flash(f'You have successfully activated the free {plan["name"]} plan!', 'success')
     else:
-        flash('Failed to activate free plan', 'danger')
+        # No match: the user already has an active subscription (or is gone)
+        flash('You already have an active subscription', 'warning')
     
     return redirect(url_for('user.subscription'))
 
@@ -328,8 +303,7 @@ def subscription_success():
             flash('Your subscription has been successfully activated! You now have access to premium features.', 'success')
             
             # Log the activity
-            activity_model = ActivityLog()
-            activity_model.log_activity(
+            activity_queue.log_activity(
                 user_id=user_id,
                 activity_type='subscription-payment',
                 details=f'Successfully processed payment for subscription (Order ID: {order_id})',
@@ -342,8 +316,7 @@ def subscription_success():
             flash('There was an issue processing your payment. Please contact support if your subscription is not activated.', 'danger')
             
             # Log the activity
-            activity_model = ActivityLog()
-            activity_model.log_activity(
+            activity_queue.log_activity(
                 user_id=user_id,
                 activity_type='subscription-payment',
                 details=f'Failed to process payment for subscription (Order ID: {order_id})',
@@ -366,8 +339,7 @@ def subscription_cancel():
     flash('Subscription payment was cancelled.', 'info')
     
     # Log the activity
-    activity_model = ActivityLog()
-    activity_model.log_activity(
+    activity_queue.log_activity(
         user_id=session['user_id'],
         activity_type='subscription-payment',
         details='Payment process was cancelled by user',
@@ -381,15 +353,13 @@ def subscription_cancel():
 def transaction_details(transaction_id):
     """Transaction details page."""
     # Get user data
-    user_model = User()
-    user = user_model.get_user_by_id(session['user_id'])
+    user = get_current_user()
     
     if not user:
         flash('User not found', 'danger')
         return redirect(url_for('auth.login'))
     
     # Get transaction details
-    transaction_model = Transaction()
     transaction = transaction_model.get_transaction(transaction_id)
     
     if not transaction:
@@ -402,10 +372,9 @@ def transaction_details(transaction_id):
         return redirect(url_for('user.subscription'))
     
     # Get plan details
-    plan_model = SubscriptionPlan()
     plan = None
     if transaction['planId']:
-        plan = plan_model.get_plan_by_id(str(transaction['planId']))
+        plan = plan_model.get_plan_by_id_cached(transaction['planId'])
     
     # Format transaction for template
     formatted_tx = {
@@ -431,7 +400,6 @@ def transaction_details(transaction_id):
 def download_receipt(transaction_id):
     """Download receipt for transaction."""
     # Get transaction details
-    transaction_model = Transaction()
     transaction = transaction_model.get_transaction(transaction_id)
     
     if not transaction:
@@ -450,10 +418,6 @@ def download_receipt(transaction_id):
     
     # Return receipt PDF or CSV (implementation depends on your receipt generation)
     try:
-        from flask import Response
-        import io
-        import csv
-        
         # Create CSV receipt (placeholder implementation)
         output = io.StringIO()
         writer = csv.writer(output)
@@ -477,8 +441,7 @@ def download_receipt(transaction_id):
         )
         
         # Log download activity
-        activity_model = ActivityLog()
-        activity_model.log_activity(
+        activity_queue.log_activity(
             user_id=session['user_id'],
             activity_type='receipt-download',
             details=f"Downloaded receipt for transaction {transaction_id}",
@@ -495,44 +458,52 @@ def download_receipt(transaction_id):
 def download_subscription_summary():
     """Download subscription summary."""
     # Get user data
-    user_model = User()
-    user = user_model.get_user_by_id(session['user_id'])
+    user = get_current_user()
     
     if not user:
         flash('User not found', 'danger')
         return redirect(url_for('auth.login'))
     
-    # Get transaction history
-    transaction_model = Transaction()
-    transactions = transaction_model.get_user_transactions(session['user_id'])
+    # Get transaction history cursor; rows are streamed rather than loaded into a list
+    query = {'userId': session['user_id']}
+    transactions = transaction_model.collection.find(
+        query, TRANSACTION_SUMMARY_PROJECTION
+    ).sort('createdAt', DESCENDING).batch_size(EXPORT_BATCH_SIZE)
     
     # Generate CSV summary (placeholder implementation)
     try:
-        from flask import Response
-        import io
-        import csv
-        
-        # Create CSV summary
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Add header
-        writer.writerow(['Subscription Summary'])
-        writer.writerow(['Date', 'Transaction ID', 'Amount', 'Status', 'Payment Method'])
+        def generate():
+            # A single small buffer is reused for every row so memory stays
+            # constant regardless of how many transactions the user has
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            
+            # Add header
+            yield SUMMARY_CSV_HEADER
+            
+            # Add transaction data
+            for tx in transactions:
+                writer.writerow([
+                    tx['createdAt'].strftime('%Y-%m-%d %H:%M') if isinstance(tx['createdAt'], datetime) else 'Unknown',
+                    str(tx['_id']),
+                    f"${tx['amount']:.2f}",
+                    tx['status'].capitalize(),
+                    tx['paymentMethod'].capitalize()
+                ])
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
         
-        # Add transaction data
-        for tx in transactions:
-            writer.writerow([
-                tx['createdAt'].strftime('%Y-%m-%d %H:%M') if isinstance(tx['createdAt'], datetime) else 'Unknown',
-                str(tx['_id']),
-                f"${tx['amount']:.2f}",
-                tx['status'].capitalize(),
-                tx['paymentMethod'].capitalize()
-            ])
+        # Users without transactions get the bare header without opening a
+        # streaming cursor; the index probe is far cheaper than the sorted scan
+        if transaction_model.collection.find_one(query, {'_id': 1}) is None:
+            body = SUMMARY_CSV_HEADER
+        else:
+            body = stream_with_context(generate())
         
-        # Create response
+        # Create (streaming) response
         response = Response(
-            output.getvalue(),
+            body,
             mimetype='text/csv',
             headers={
                 'Content-Disposition': f'attachment; filename=subscription_summary.csv'
@@ -540,8 +511,7 @@ def download_subscription_summary():
         )
         
         # Log download activity
-        activity_model = ActivityLog()
-        activity_model.log_activity(
+        activity_queue.log_activity(
             user_id=session['user_id'],
             activity_type='summary-download',
             details="Downloaded subscription summary",
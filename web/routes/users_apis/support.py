@@ -6,8 +6,8 @@ from flask import (
     render_template, flash, session, redirect, url_for
 )
 
+from web.utils.helpers import get_current_user
 from web.utils.decorators import login_required
-from database.models.user import User
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -21,8 +21,7 @@ def register_routes(user_bp):
 def support():
     """Help and support route."""
     # Get user data
-    user_model = User()
-    user = user_model.get_user_by_id(session['user_id'])
+    user = get_current_user()
     
     if not user:
         # Flash error message
@@ -9,11 +9,10 @@ import json
 import io
 import csv
 
+from web.utils import activity_queue
+from web.utils.helpers import get_current_user
 from web.utils.decorators import login_required, api_error_handler
-from database.models.user import User
-from database.models.subscription import SubscriptionPlan
-from database.models.transaction import Transaction
-from database.models.activity_log import ActivityLog
+from database.models import plan_model, transaction_model
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -22,15 +21,13 @@ logger = logging.getLogger(__name__)
 def transaction_details(transaction_id):
     """Transaction details page."""
     # Get user data
-    user_model = User()
-    user = user_model.get_user_by_id(session['user_id'])
+    user = get_current_user()
     
     if not user:
         flash('User not found', 'danger')
         return redirect(url_for('auth.login'))
     
     # Get transaction details
-    transaction_model = Transaction()
     transaction = transaction_model.get_transaction(transaction_id)
     
     if not transaction:
@@ -43,10 +40,9 @@ def transaction_details(transaction_id):
         return redirect(url_for('user.subscription'))
     
     # Get plan details
-    plan_model = SubscriptionPlan()
     plan = None
     if transaction.get('planId'):
-        plan = plan_model.get_plan_by_id(str(transaction['planId']))
+        plan = plan_model.get_plan_by_id_cached(str(transaction['planId']))
     
     # Format transaction for template
     formatted_tx = {
@@ -62,8 +58,7 @@ def transaction_details(transaction_id):
     
     # Log view activity
     try:
-        activity_model = ActivityLog()
-        activity_model.log_activity(
+        activity_queue.log_activity(
             user_id=session['user_id'],
             activity_type='transaction-view',
             details=f"Viewed transaction details for {formatted_tx['id']}",
@@ -84,7 +79,6 @@ def transaction_details(transaction_id):
 def download_receipt(transaction_id):
     """Download receipt for transaction."""
     # Get transaction details
-    transaction_model = Transaction()
     transaction = transaction_model.get_transaction(transaction_id)
     
     if not transaction:
@@ -104,13 +98,11 @@ def download_receipt(transaction_id):
     # Generate receipt
     try:
         # Get user and plan data
-        user_model = User()
-        plan_model = SubscriptionPlan()
         
-        user = user_model.get_user_by_id(session['user_id'])
+        user = get_current_user()
         plan = None
         if transaction.get('planId'):
-            plan = plan_model.get_plan_by_id(str(transaction['planId']))
+            plan = plan_model.get_plan_by_id_cached(str(transaction['planId']))
         
         # Create CSV receipt
         output = io.StringIO()
@@ -142,8 +134,7 @@ def download_receipt(transaction_id):
         
         # Log download activity
         try:
-            activity_model = ActivityLog()
-            activity_model.log_activity(
+            activity_queue.log_activity(
                 user_id=session['user_id'],
                 activity_type='receipt-download',
                 details=f"Downloaded receipt for transaction {transaction_id}",
@@ -162,19 +153,17 @@ def download_receipt(transaction_id):
 def download_subscription_summary():
     """Download subscription summary."""
     # Get user data
-    user_model = User()
-    user = user_model.get_user_by_id(session['user_id'])
+    user = get_current_user()
     
     if not user:
         flash('User not found', 'danger')
         return redirect(url_for('auth.login'))
     
     # Get transaction history
-    transaction_model = Transaction()
     transactions = transaction_model.get_user_transactions(session['user_id'])
     
-    # Get plan data
-    plan_model = SubscriptionPlan()
+    # Load every plan the transactions refer to in one query
+    plans_by_id = plan_model.get_plans_by_ids(tx['planId'] for tx in transactions if tx.get('planId'))
     
     # Generate CSV summary
     try:
@@ -186,7 +175,7 @@ def download_subscription_summary():
         # Write transactions
         for tx in transactions:
             # Get plan info
-            plan_info = plan_model.get_plan_by_id(str(tx.get('planId'))) if tx.get('planId') else None
+            plan_info = plans_by_id.get(str(tx.get('planId'))) if tx.get('planId') else None
             plan_name = plan_info['name'] if plan_info else 'Unknown Plan'
             
             writer.writerow({
@@ -211,8 +200,7 @@ def download_subscription_summary():
         
         # Log download activity
         try:
-            activity_model = ActivityLog()
-            activity_model.log_activity(
+            activity_queue.log_activity(
                 user_id=session['user_id'],
                 activity_type='subscription-summary-download',
                 details="Downloaded subscription transaction summary",
@@ -232,8 +220,7 @@ def download_subscription_summary():
 def get_transaction_history():
     """API endpoint to get transaction history."""
     # Get user data
-    user_model = User()
-    user = user_model.get_user_by_id(session['user_id'])
+    user = get_current_user()
     
     if not user:
         return jsonify({
@@ -242,17 +229,16 @@ def get_transaction_history():
         }), 404
     
     # Get transaction history
-    transaction_model = Transaction()
     transactions = transaction_model.get_user_transactions(session['user_id'])
     
-    # Get plan model
-    plan_model = SubscriptionPlan()
+    # Load every plan the transactions refer to in one query
+    plans_by_id = plan_model.get_plans_by_ids(tx['planId'] for tx in transactions if tx.get('planId'))
     
     # Format transaction history
     transaction_history = []
     for tx in transactions:
         # Get plan info
-        plan_info = plan_model.get_plan_by_id(str(tx.get('planId'))) if tx.get('planId') else None
+        plan_info = plans_by_id.get(str(tx.get('planId'))) if tx.get('planId') else None
         plan_name = plan_info['name'] if plan_info else 'Unknown Plan'
         
         # Format dates properly for display
@@ -279,7 +265,6 @@ def get_transaction_history():
 def get_transaction_details(transaction_id):
     """API endpoint to get transaction details."""
     # Get transaction details
-    transaction_model = Transaction()
     transaction = transaction_model.get_transaction(transaction_id)
     
     if not transaction:
@@ -296,10 +281,9 @@ def get_transaction_details(transaction_id):
         }), 403
     
     # Get plan details
-    plan_model = SubscriptionPlan()
     plan = None
     if transaction.get('planId'):
-        plan = plan_model.get_plan_by_id(str(transaction['planId']))
+        plan = plan_model.get_plan_by_id_cached(str(transaction['planId']))
     
     # Format transaction
     formatted_tx = {
@@ -9,13 +9,14 @@ from flask import (
 )
 from bson import ObjectId
 
+from web.utils import activity_queue, jobs
+from web.utils.helpers import get_current_user
 from web.utils.decorators import login_required
-from database.models.user import User
-from database.models.activity_log import ActivityLog
 from web.routes.users_apis.villages import extract_villages_internal
 
 # Import Gold Club verification function
 from web.utils.gold_club import check_gold_club_membership
+from database.models import user_model, activity_model
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -40,7 +41,6 @@ def is_travian_account_registered(username, server, exclude_user_id=None):
     Returns:
         bool: True if account is already registered, False otherwise
     """
-    user_model = User()
     
     # Normalize the server URL for comparison
     if server and not server.startswith(('http://', 'https://')):
@@ -63,12 +63,69 @@ def is_travian_account_registered(username, server, exclude_user_id=None):
     count = user_model.collection.count_documents(query)
     return count > 0
 
+def connect_travian_account(user_id):
+    """
+    Verify a user's Travian connection, extract their villages and store
+    their Gold Club status. Runs as a background job, so it must not touch
+    the request or session.
+    
+    Args:
+        user_id (str): User ID
+        
+    Returns:
+        dict: Result dictionary with keys 'success' and 'message'
+    """
+    extraction_result = extract_villages_internal(user_id)
+    
+    if not extraction_result.get('success'):
+        logger.warning(f"Village extraction failed for user {user_id}: {extraction_result.get('message', 'Unknown error')}")
+        
+        # Log failed connection
+        activity_queue.log_activity(
+            user_id=user_id,
+            activity_type='travian-connection',
+            details=f"Failed to extract villages: {extraction_result.get('message', 'Unknown error')}",
+            status='error'
+        )
+        return extraction_result
+    
+    villages_count = len(extraction_result.get('data', []))
+    logger.info(f"Villages extracted for user {user_id}: {villages_count}")
+    
+    # Log successful connection
+    activity_queue.log_activity(
+        user_id=user_id,
+        activity_type='travian-connection',
+        details='Successfully connected to Travian account and extracted villages from profile',
+        status='success',
+        data={
+            'villages_count': villages_count
+        }
+    )
+    
+    # Update user's Gold Club status from the same browser session
+    is_gold_member = extraction_result.get('gold_club_check', False)
+    user_model.update_user(user_id, {
+        'travianCredentials.is_gold_member': is_gold_member
+    })
+    
+    activity_queue.log_activity(
+        user_id=user_id,
+        activity_type='gold-club-check',
+        details='Gold Club membership confirmed' if is_gold_member else 'User is not a Gold Club member',
+        status='success' if is_gold_member else 'info'
+    )
+    
+    return {
+        'success': True,
+        'message': f'Successfully extracted {villages_count} villages'
+    }
+
 @login_required
 def travian_settings():
     """Travian account settings route."""
     # Get user data
-    user_model = User()
-    user = user_model.get_user_by_id(session['user_id'])
+    user = get_current_user()
     
     if not user:
         # Flash error message
@@ -130,7 +187,6 @@ def travian_settings():
             
             # Try to get connection log information
             try:
-                activity_model = ActivityLog()
                 connection_log = activity_model.get_latest_user_activity(
                     user_id=session['user_id'],
                     activity_type='travian-connection'
@@ -166,91 +222,11 @@ def travian_settings():
             flash('Travian account settings updated successfully', 'success')
             logger.info(f"User '{user['username']}' updated Travian settings")
             
-            # Attempt to verify connection with Travian servers
-            try:
-                # Get fresh user data with updated credentials
-                updated_user = user_model.get_user_by_id(session['user_id'])
-                
-                # Notify user that we're trying connection
-                flash('Verifying connection and extracting villages from your profile...', 'info')
-                
-                # Execute village extraction (which also verifies connection)
-                extraction_result = extract_villages_internal(session['user_id'])
-                
-                if extraction_result.get('success'):
-                    villages_count = len(extraction_result.get('data', []))
-                    flash(f'Successfully extracted {villages_count} villages from your Travian profile!', 'success')
-                    logger.info(f"Villages extracted for user '{user['username']}': {villages_count}")
-                    
-                    # Log successful connection
-                    activity_model = ActivityLog()
-                    activity_model.log_activity(
-                        user_id=session['user_id'],
-                        activity_type='travian-connection',
-                        details='Successfully connected to Travian account and extracted villages from profile',
-                        status='success',
-                        data={
-                            'villages_count': villages_count
-                        }
-                    )
-                    
-                    # Now check for Gold Club membership using the driver from the village extraction
-                    if 'gold_club_check' in extraction_result:
-                        is_gold_member = extraction_result.get('gold_club_check', False)
-                        
-                        # Update user's Gold Club status
-                        user_model.update_user(session['user_id'], {
-                            'travianCredentials.is_gold_member': is_gold_member
-                        })
-                        
-                        # Show appropriate message based on result
-                        if is_gold_member:
-                            flash('Gold Club membership confirmed!', 'success')
-                            
-                            # Log Gold Club membership
-                            activity_model.log_activity(
-                                user_id=session['user_id'],
-                                activity_type='gold-club-check',
-                                details='Gold Club membership confirmed',
-                                status='success'
-                            )
-                        else:
-                            flash('You are not a Gold Club member. Some premium features may be unavailable.', 'warning')
-                            
-                            # Log non-Gold Club status
-                            activity_model.log_activity(
-                                user_id=session['user_id'],
-                                activity_type='gold-club-check',
-                                details='User is not a Gold Club member',
-                                status='info'
-                            )
-                else:
-                    flash(f"Your settings were saved but village extraction failed: {extraction_result.get('message', 'Unknown error')}", 'warning')
-                    logger.warning(f"Village extraction failed for user '{user['username']}': {extraction_result.get('message', 'Unknown error')}")
-                    
-                    # Log failed connection
-                    activity_model = ActivityLog()
-                    activity_model.log_activity(
-                        user_id=session['user_id'],
-                        activity_type='travian-connection',
-                        details=f"Failed to extract villages: {extraction_result.get('message', 'Unknown error')}",
-                        status='error'
-                    )
-            except Exception as e:
-                logger.error(f"Error during connection verification: {e}")
-                flash('Settings saved but there was an error verifying the connection', 'warning')
-                
-                # Log error
-                try:
-                    activity_model = ActivityLog()
-                    activity_model.log_activity(
-                        user_id=session['user_id'],
-                        activity_type='travian-settings-update',
-                        details=f'Updated Travian settings but verification failed: {str(e)}',
-                        status='warning'
-                    )
-                except Exception as log_err:
-                    logger.error(f"Error logging activity: {log_err}")
+            # Verify the connection off the request thread; the browser login takes tens of seconds
+            if jobs.submit_job(session['user_id'], connect_travian_account, session['user_id']):
+                flash('Verifying connection and extracting villages from your profile. Your villages will update shortly.', 'info')
+            else:
+                flash('Settings saved, but too many Travian checks are running. Extract your villages from the Villages page later.', 'warning')
         else:
             # Flash error message
             flash('Failed to update Travian account settings', 'danger')
@@ -272,7 +248,6 @@ def travian_settings():
     }
     
     try:
-        activity_model = ActivityLog()
         
         # Get latest connection activity
         connection_log = activity_model.get_latest_user_activity(
@@ -299,8 +274,7 @@ def travian_settings():
 def disconnect_travian():
     """Disconnect Travian account route."""
     # Get user data
-    user_model = User()
-    user = user_model.get_user_by_id(session['user_id'])
+    user = get_current_user()
     
     if not user:
         # Flash error message
@@ -325,8 +299,7 @@ def disconnect_travian():
         user_model.update_user(session['user_id'], {'villages': []})
         
         # Log the activity
-        activity_model = ActivityLog()
-        activity_model.log_activity(
+        activity_queue.log_activity(
             user_id=session['user_id'],
             activity_type='travian-disconnect',
             details='Travian account disconnected successfully',
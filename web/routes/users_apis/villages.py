@@ -11,31 +11,30 @@ from flask import (
 )
 from bson import ObjectId
 
+from web.utils import activity_queue, jobs
+from web.utils.helpers import get_current_user
 from web.utils.decorators import login_required, api_error_handler
-from database.models.user import User
-from database.models.activity_log import ActivityLog
 from web.utils.gold_club import check_gold_club_membership
+from database.models import user_model, activity_model
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
 # Define the extract_villages_internal function first, before it's referenced
-def extract_villages_internal(user_id):
+def extract_villages_internal(user_id, save=True):
     """
     Extract villages internally (without HTTP request/response).
     This can be called from travian_settings when a user adds/updates their account.
     
     Args:
         user_id (str): User ID
+        save (bool): Store the extracted villages and log the extraction;
+            pass False for a read-only check
         
     Returns:
         dict: Result dictionary with keys 'success', 'message', and optionally 'data'
     """
-    from database.models.user import User
-    from database.models.activity_log import ActivityLog
-    
     # Get user data
-    user_model = User()
     user = user_model.get_user_by_id(user_id)
     
     if not user:
@@ -352,6 +351,14 @@ def extract_villages_internal(user_id):
             driver.quit()
             logger.info("Browser closed")
         
+        if not save:
+            return {
+                'success': True,
+                'message': f'Found {len(extracted_villages)} villages',
+                'data': extracted_villages,
+                'gold_club_check': is_gold_member
+            }
+        
         # Preserve existing settings when updating villages
         current_villages = user.get('villages', [])
         village_settings = {}
@@ -380,8 +387,7 @@ def extract_villages_internal(user_id):
         logger.info("Updating user's villages in database")
         if user_model.update_user(user_id, {'villages': extracted_villages}):
             # Log the activity
-            activity_model = ActivityLog()
-            activity_model.log_activity(
+            activity_queue.log_activity(
                 user_id=user_id,
                 activity_type='village-extract',
                 details=f"Automatically extracted {len(extracted_villages)} villages from Travian",
@@ -425,13 +431,15 @@ def register_routes(user_bp):
     user_bp.route('/api/user/villages/remove', methods=['POST'])(api_error_handler(login_required(remove_village)))
     user_bp.route('/api/user/villages/settings', methods=['POST'])(api_error_handler(login_required(update_village_settings)))
     user_bp.route('/api/user/villages/extract', methods=['POST'])(api_error_handler(login_required(extract_villages)))
+    user_bp.route('/api/user/villages/extract/<job_id>')(api_error_handler(login_required(extract_villages_status)))
+    user_bp.route('/api/user/verify-gold-club', methods=['POST'])(api_error_handler(login_required(verify_gold_club)))
+    user_bp.route('/api/user/verify-gold-club/<job_id>')(api_error_handler(login_required(verify_gold_club_status)))
 
 @login_required
 def villages():
     """Villages management route."""
     # Get user data
-    user_model = User()
-    user = user_model.get_user_by_id(session['user_id'])
+    user = get_current_user()
     
     if not user:
         # Flash error message
@@ -452,7 +460,6 @@ def villages():
     formatted_villages = []
     for village in user.get('villages', []):
         # Get activity logs for this village
-        activity_model = ActivityLog()
         
         # Get the last farm activity for this village
         farm_activity = activity_model.get_latest_user_activity(
@@ -503,8 +510,7 @@ def villages():
 def add_village():
     """API endpoint to add a village manually."""
     # Get user data
-    user_model = User()
-    user = user_model.get_user_by_id(session['user_id'])
+    user = get_current_user()
     
     if not user:
         return jsonify({
@@ -549,22 +555,16 @@ def add_village():
     }
     
     # Check if village with this newdid already exists
-    current_villages = user.get('villages', [])
-    for existing_village in current_villages:
-        if existing_village.get('newdid') == village['newdid']:
-            return jsonify({
-                'success': False,
-                'message': 'A village with this ID already exists'
-            }), 400
-    
-    # Add village to user's villages
-    current_villages.append(village)
+    if any(existing_village.get('newdid') == village['newdid'] for existing_village in user.get('villages', [])):
+        return jsonify({
+            'success': False,
+            'message': 'A village with this ID already exists'
+        }), 400
     
-    # Update user in database
-    if user_model.update_user(session['user_id'], {'villages': current_villages}):
+    # Push the village; the update itself re-checks for duplicates
+    if user_model.add_village(session['user_id'], village):
         # Log the activity
-        activity_model = ActivityLog()
-        activity_model.log_activity(
+        activity_queue.log_activity(
             user_id=session['user_id'],
             activity_type='village-add',
             details=f"Manually added village: {village['name']} ({village['x']}|{village['y']})",
@@ -590,8 +590,7 @@ def add_village():
 def update_village():
     """API endpoint to update a village."""
     # Get user data
-    user_model = User()
-    user = user_model.get_user_by_id(session['user_id'])
+    user = get_current_user()
     
     if not user:
         return jsonify({
@@ -648,8 +647,7 @@ def update_village():
     # Update user in database
     if user_model.update_user(session['user_id'], {'villages': current_villages}):
         # Log the activity
-        activity_model = ActivityLog()
-        activity_model.log_activity(
+        activity_queue.log_activity(
             user_id=session['user_id'],
             activity_type='village-update',
             details=f"Updated village: {current_villages[village_idx]['name']} ({current_villages[village_idx]['x']}|{current_villages[village_idx]['y']})",
@@ -675,8 +673,7 @@ def update_village():
 def remove_village():
     """API endpoint to remove a village."""
     # Get user data
-    user_model = User()
-    user = user_model.get_user_by_id(session['user_id'])
+    user = get_current_user()
     
     if not user:
         return jsonify({
@@ -708,14 +705,10 @@ def remove_village():
             'message': 'Village not found'
         }), 404
     
-    # Remove the village from the list
-    current_villages = [v for v in current_villages if str(v.get('newdid')) != str(data['village_id'])]
-    
-    # Update user in database
-    if user_model.update_user(session['user_id'], {'villages': current_villages}):
+    # Pull the village in place rather than rewriting the whole list
+    if user_model.remove_village(session['user_id'], village_to_remove.get('newdid')):
         # Log the activity
-        activity_model = ActivityLog()
-        activity_model.log_activity(
+        activity_queue.log_activity(
             user_id=session['user_id'],
             activity_type='village-remove',
             details=f"Removed village: {village_to_remove['name']} ({village_to_remove['x']}|{village_to_remove['y']})",
@@ -739,8 +732,7 @@ def remove_village():
 def update_village_settings():
     """API endpoint to update village automation settings."""
     # Get user data
-    user_model = User()
-    user = user_model.get_user_by_id(session['user_id'])
+    user = get_current_user()
     
     if not user:
         return jsonify({
@@ -778,8 +770,7 @@ def update_village_settings():
     # Update user in database
     if user_model.update_user(session['user_id'], {'villages': current_villages}):
         # Log the activity
-        activity_model = ActivityLog()
-        activity_model.log_activity(
+        activity_queue.log_activity(
             user_id=session['user_id'],
             activity_type='village-settings',
             details=f"Updated automation settings for {len(auto_farm_villages)} auto-farm villages and {len(training_villages)} training villages",
@@ -798,22 +789,100 @@ def update_village_settings():
             'message': 'Failed to update village settings'
         }), 500
 
+def _job_status_response(job_id):
+    """
+    Build the polling response for a background job owned by the current user.
+    
+    Args:
+        job_id (str): Job ID
+        
+    Returns:
+        Response: JSON response with the job state and result
+    """
+    job = jobs.get_job(job_id, session['user_id'])
+    
+    if not job:
+        return jsonify({
+            'success': False,
+            'message': 'Job not found'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'state': job['state'],
+        'result': job['result']
+    })
+
+def _job_started_response(job_id):
+    """
+    Build the response for a newly submitted background job.
+    
+    Args:
+        job_id (str): Job ID, or None if the job queue was full
+        
+    Returns:
+        Response: 202 JSON response with the job ID, or 429 if the queue was full
+    """
+    if not job_id:
+        return jsonify({
+            'success': False,
+            'message': 'Too many Travian checks in progress. Please try again shortly.'
+        }), 429
+    
+    return jsonify({
+        'success': True,
+        'job_id': job_id
+    }), 202
+
 @api_error_handler
 @login_required
 def extract_villages():
-    """API endpoint to extract villages from Travian."""
-    # Call the internal function, just passing the user ID from the session
-    result = extract_villages_internal(session['user_id'])
+    """API endpoint to start extracting villages from Travian."""
+    # The browser session takes tens of seconds, so run it off the request thread
+    job_id = jobs.submit_job(session['user_id'], extract_villages_internal, session['user_id'])
+    return _job_started_response(job_id)
+
+@api_error_handler
+@login_required
+def extract_villages_status(job_id):
+    """API endpoint to poll a village extraction."""
+    return _job_status_response(job_id)
+
+def verify_gold_club_internal(user_id):
+    """
+    Check a user's Gold Club membership without storing anything.
     
-    # Return JSON response based on the result
-    if result.get('success'):
-        return jsonify({
-            'success': True,
-            'message': result.get('message', f'Successfully extracted {len(result.get("data", []))} villages'),
-            'data': result.get('data', [])
-        })
-    else:
-        return jsonify({
+    Args:
+        user_id (str): User ID
+        
+    Returns:
+        dict: Result dictionary with keys 'success', 'message', and optionally 'is_gold_member'
+    """
+    result = extract_villages_internal(user_id, save=False)
+    
+    if not result.get('success'):
+        return {
             'success': False,
-            'message': result.get('message', 'Unknown error occurred during extraction')
-        }), 500
+            'message': result.get('message', 'Unable to connect to Travian')
+        }
+    
+    is_gold_member = result.get('gold_club_check', False)
+    
+    return {
+        'success': True,
+        'message': 'Gold Club membership confirmed' if is_gold_member else 'Not a Gold Club member',
+        'is_gold_member': is_gold_member
+    }
+
+@api_error_handler
+@login_required
+def verify_gold_club():
+    """API endpoint to start a Gold Club membership check."""
+    job_id = jobs.submit_job(session['user_id'], verify_gold_club_internal, session['user_id'])
+    return _job_started_response(job_id)
+
+@api_error_handler
+@login_required
+def verify_gold_club_status(job_id):
+    """API endpoint to poll a Gold Club membership check."""
+    return _job_status_response(job_id)
@@ -4,14 +4,10 @@ This module handles webhooks from payment providers.
 """
 import logging
 import json
-from bson import ObjectId
-from datetime import datetime
 from flask import Blueprint, request, jsonify
 
-from database.models.transaction import Transaction
-from database.models.user import User
-from database.models.activity_log import ActivityLog
 from payment.paypal import verify_webhook_signature, process_successful_payment
+from database.models import user_model, activity_model, transaction_model
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -171,7 +167,6 @@ def handle_payment_denied(event_data):
         logger.info(f"Processing denied payment: {payment_id}")
         
         # Get transaction for this payment
-        transaction_model = Transaction()
         transaction = transaction_model.get_transaction_by_payment_id(payment_id)
         
         if not transaction:
@@ -188,7 +183,6 @@ def handle_payment_denied(event_data):
         if result:
             # Log the activity
             try:
-                activity_model = ActivityLog()
                 activity_model.log_activity(
                     user_id=str(transaction['userId']),
                     activity_type='payment-failed',
@@ -241,7 +235,6 @@ def handle_payment_refunded(event_data):
         logger.info(f"Processing refunded payment: {payment_id}")
         
         # Get transaction for this payment
-        transaction_model = Transaction()
         transaction = transaction_model.get_transaction_by_payment_id(payment_id)
         
         if not transaction:
@@ -256,40 +249,21 @@ def handle_payment_refunded(event_data):
         result = transaction_model.update_transaction_status(transaction_id, 'refunded')
         
         if result:
-            # Update user subscription status
-            user_model = User()
-            user = user_model.get_user_by_id(str(transaction['userId']))
+            # Check if this was the most recent successful payment
+            recent_tx = transaction_model.get_user_transactions(
+                str(transaction['userId']), 
+                status='completed',
+                limit=1
+            )
             
-            if user and user['subscription']['status'] == 'active':
-                # Check if this was the most recent successful payment
-                recent_tx = transaction_model.get_user_transactions(
-                    str(transaction['userId']), 
-                    status='completed',
-                    limit=1
-                )
-                
-                if not recent_tx or str(recent_tx[0]['_id']) == transaction_id:
-                    # This was the most recent payment, cancel the subscription
-                    try:
-                        if hasattr(user_model, 'cancel_subscription'):
-                            user_model.cancel_subscription(str(transaction['userId']))
-                        else:
-                            # Direct update if method not available
-                            user_model.collection.update_one(
-                                {'_id': ObjectId(str(transaction['userId']))},
-                                {'$set': {
-                                    'subscription.status': 'cancelled',
-                                    'updatedAt': datetime.utcnow()
-                                }}
-                            )
-                        
-                        logger.info(f"Cancelled subscription for user {transaction['userId']} due to refund")
-                    except Exception as e:
-                        logger.error(f"Error updating subscription status: {e}")
+            if not recent_tx or str(recent_tx[0]['_id']) == transaction_id:
+                # This was the most recent payment, cancel the subscription
+                # (only matches while it is still active)
+                if user_model.cancel_subscription(str(transaction['userId'])):
+                    logger.info(f"Cancelled subscription for user {transaction['userId']} due to refund")
             
             # Log the activity
             try:
-                activity_model = ActivityLog()
                 activity_model.log_activity(
                     user_id=str(transaction['userId']),
                     activity_type='payment-refunded',
@@ -341,9 +315,6 @@ def handle_subscription_cancelled(event_data):
         
         logger.info(f"Processing cancelled subscription: {subscription_id}")
         
-        # Get user with this subscription ID
-        user_model = User()
-        
         # In a real implementation, you would need to store the PayPal subscription ID
         # For now, we'll log the webhook but not take action
         logger.info(f"Received subscription cancelled webhook for subscription ID: {subscription_id}")
@@ -383,9 +354,6 @@ def handle_subscription_expired(event_data):
         
         logger.info(f"Processing expired subscription: {subscription_id}")
         
-        # Get user with this subscription ID
-        user_model = User()
-        
         # In a real implementation, you would need to store the PayPal subscription ID
         # For now, we'll log the webhook but not take action
         logger.info(f"Received subscription expired webhook for subscription ID: {subscription_id}")
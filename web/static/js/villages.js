@@ -228,6 +228,7 @@ function startVillageExtraction() {
                 }
                 return response.json();
             })
+            .then(data => data.job_id ? pollExtractJob(data.job_id) : data)
             .then(data => {
                 console.log("Extract villages response:", data);
                 progressBar.style.width = '100%';
@@ -291,6 +292,40 @@ function startVillageExtraction() {
     }, 1000);
 }
 
+/**
+ * Poll a background village extraction until it finishes
+ * @param {string} jobId - Job ID returned when the extraction started
+ * @returns {Promise<Object>} Extraction result
+ */
+function pollExtractJob(jobId) {
+    return new Promise((resolve, reject) => {
+        const poll = () => {
+            fetch(`/api/user/villages/extract/${encodeURIComponent(jobId)}`, {
+                headers: {
+                    'Accept': 'application/json',
+                    'X-Requested-With': 'XMLHttpRequest'
+                }
+            })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP error! Status: ${response.status}`);
+                }
+                return response.json();
+            })
+            .then(job => {
+                if (job.state === 'SUCCESS' || job.state === 'FAILURE') {
+                    resolve(job.result || { success: false, message: 'Extraction failed' });
+                } else {
+                    setTimeout(poll, 2000);
+                }
+            })
+            .catch(reject);
+        };
+        
+        poll();
+    });
+}
+
 /**
  * Show extraction error
  * @param {string} message - Error message to display
@@ -0,0 +1,124 @@
+"""
+Queued activity logging for Travian Whispers web application.
+This module takes activity log writes off the request path: entries are queued
+in memory and a background thread stores them in batches.
+"""
+import atexit
+import logging
+import queue
+import threading
+
+from database import models
+from database.models.activity_log import ActivityLog
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+# Bounded so a stalled database cannot grow memory without limit; when full,
+# new entries are dropped (and logged) rather than blocking requests
+QUEUE_MAX_SIZE = 10000
+
+# Most entries stored per insert_many, and how long the writer waits for more
+# entries before storing a partial batch
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 0.5
+
+_queue = queue.Queue(maxsize=QUEUE_MAX_SIZE)
+_writer = None
+_writer_lock = threading.Lock()
+
+def log_activity(user_id, activity_type, details=None, status='success', village=None, data=None):
+    """
+    Queue a user activity to be logged; never blocks and never raises.
+    
+    Args:
+        user_id (str): User ID
+        activity_type (str): Type of activity
+        details (str): Details of the activity
+        status (str): Status of the activity (success, warning, error, info)
+        village (str): Village name or ID (optional)
+        data (dict): Additional data for the activity (optional)
+    
+    Returns:
+        bool: True if the entry was queued, False if the queue was full
+    """
+    _ensure_writer()
+    
+    # The timestamp is taken now, not when the batch is written
+    entry = ActivityLog.build_entry(user_id, activity_type, details, status, village, data)
+    
+    try:
+        _queue.put_nowait(entry)
+        return True
+    except queue.Full:
+        logger.warning(f"Activity queue full; dropped {activity_type} entry for user {user_id}")
+        return False
+
+def _ensure_writer():
+    """Start the background writer thread on first use."""
+    global _writer
+    
+    if _writer is not None:
+        return
+    
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_write_loop, name='activity-log-writer', daemon=True)
+            _writer.start()
+            atexit.register(_flush)
+
+def _next_batch(timeout):
+    """
+    Collect up to BATCH_SIZE queued entries.
+    
+    Args:
+        timeout (float): Seconds to wait for the first entry, or None to wait forever
+    
+    Returns:
+        list: Queued entries (empty if none arrived in time)
+    """
+    try:
+        batch = [_queue.get(timeout=timeout)]
+    except queue.Empty:
+        return []
+    
+    while len(batch) < BATCH_SIZE:
+        try:
+            batch.append(_queue.get(timeout=FLUSH_INTERVAL))
+        except queue.Empty:
+            break
+    
+    return batch
+
+def _store(batch):
+    """
+    Insert a batch of entries, logging instead of raising on failure.
+    
+    Args:
+        batch (list): Activity log documents
+    """
+    try:
+        collection = models.activity_model.collection
+        if collection is None:
+            logger.error(f"Database connection not available; dropped {len(batch)} activity entries")
+            return
+        
+        # Unordered so one bad document does not stop the rest of the batch
+        collection.insert_many(batch, ordered=False)
+    except Exception as e:
+        logger.error(f"Error storing {len(batch)} activity entries: {e}")
+
+def _write_loop():
+    """Store queued entries for the lifetime of the process."""
+    while True:
+        batch = _next_batch(timeout=None)
+        if batch:
+            _store(batch)
+
+def _flush():
+    """Store whatever is still queued when the process exits."""
+    while True:
+        batch = _next_batch(timeout=0)
+        if not batch:
+            break
+        _store(batch)
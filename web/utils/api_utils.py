@@ -3,34 +3,18 @@ API utilities for Travian Whispers web application.
 This module provides utility functions for API endpoints.
 """
 import logging
-import json
-from flask import Response, make_response
-from bson import ObjectId
-from datetime import datetime
+from flask import current_app
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
-def custom_json_encoder(obj):
-    """
-    Custom JSON encoder for MongoDB ObjectId and datetime objects.
-    
-    Args:
-        obj: Object to encode
-        
-    Returns:
-        JSON serializable object
-    """
-    if isinstance(obj, ObjectId):
-        return str(obj)
-    if isinstance(obj, datetime):
-        return obj.isoformat() if obj else None
-    raise TypeError(f"Type {type(obj)} not serializable")
-
 def jsonify(data, status=200):
     """
     Create a JSON response with the correct content type.
     
+    Serialization goes through the app's JSON provider, which encodes
+    ObjectId and datetime values itself.
+    
     Args:
         data: Data to serialize
         status: HTTP status code
@@ -38,21 +22,17 @@ def jsonify(data, status=200):
     Returns:
         Flask response object
     """
-    # First serialize the data to a JSON string
     try:
-        json_str = json.dumps(data, default=custom_json_encoder)
+        response = current_app.json.response(data)
     except TypeError as e:
         logger.error(f"JSON serialization error: {e}")
-        json_str = json.dumps({
+        response = current_app.json.response({
             "success": False,
             "message": "Data serialization error"
         })
         status = 500
     
-    # Create a response with the correct content type
-    response = make_response(json_str, status)
-    response.headers['Content-Type'] = 'application/json'
-    
+    response.status_code = status
     return response
 
 def success_response(data=None, message=None):
@@ -0,0 +1,46 @@
+"""
+Background task utilities for Travian Whispers web application.
+This module runs fire-and-forget work off the request thread.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+# Shared worker pool; tasks must not rely on the Flask request or app context
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='background-task')
+
+def _run_task(func, args, kwargs):
+    """
+    Run a task and log any exception instead of letting it vanish in the pool.
+
+    Args:
+        func: Callable to run
+        args (tuple): Positional arguments
+        kwargs (dict): Keyword arguments
+
+    Returns:
+        The callable's return value, or None if it raised
+    """
+    try:
+        return func(*args, **kwargs)
+    except Exception as e:
+        logger.error(f"Background task {getattr(func, '__qualname__', func)} failed: {e}", exc_info=True)
+        return None
+
+def run_in_background(func, *args, **kwargs):
+    """
+    Schedule a callable to run on the background worker pool.
+
+    Failures are logged and never re-raised to the caller.
+
+    Args:
+        func: Callable to run
+        *args: Positional arguments for the callable
+        **kwargs: Keyword arguments for the callable
+
+    Returns:
+        concurrent.futures.Future: Future for the scheduled task
+    """
+    return _executor.submit(_run_task, func, args, kwargs)
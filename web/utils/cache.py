@@ -0,0 +1,52 @@
+"""
+Shared cache for Travian Whispers web application.
+This module provides a cachelib cache, backed by Redis when
+CACHE_REDIS_URL is configured and by process memory otherwise.
+"""
+import logging
+import threading
+from cachelib import SimpleCache, RedisCache
+
+import config
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """
+    Get the shared cache, creating it on first use.
+    
+    Returns:
+        cachelib.BaseCache: RedisCache if CACHE_REDIS_URL is set, SimpleCache otherwise
+    """
+    global _cache
+    
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = _create_cache()
+    
+    return _cache
+
+def _create_cache():
+    """
+    Build the cache backend from configuration.
+    
+    Returns:
+        cachelib.BaseCache: Cache instance
+    """
+    if config.CACHE_REDIS_URL:
+        try:
+            # redis is only needed when a Redis URL is configured
+            import redis
+            
+            client = redis.Redis.from_url(config.CACHE_REDIS_URL)
+            logger.info("Using Redis shared cache")
+            return RedisCache(host=client, key_prefix='tw:')
+        except ImportError:
+            logger.warning("CACHE_REDIS_URL is set but the redis package is not installed; using in-memory cache")
+    
+    return SimpleCache(threshold=1000)
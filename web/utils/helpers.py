@@ -5,11 +5,9 @@ This module provides utility functions for the application.
 import logging
 import json
 from bson import ObjectId
-from flask import request, session, render_template, current_app
+from flask import request, session, render_template, current_app, g
 from datetime import datetime
 
-from database.models import user
-
 # Initialize logger
 logger = logging.getLogger(__name__)
 
@@ -38,14 +36,52 @@ def get_ip_address():
 
 
 def get_current_user():
-    """Get the current authenticated user."""
-    from database.models.user import User
+    """Get the current authenticated user, loaded at most once per request."""
+    from database.models import user_model
+    
+    if 'user_id' not in session:
+        return None
     
+    # Cache on g, keyed by the session user in case it changes mid-request (login)
+    if g.get('current_user_id') != session['user_id']:
+        g.current_user = user_model.get_user_by_id(session['user_id'])
+        g.current_user_id = session['user_id']
+    
+    return g.current_user
+
+
+def get_current_user_oid():
+    """Get the current user's ID as an ObjectId, parsed at most once per request."""
     if 'user_id' not in session:
         return None
     
-    user_model = User()
-    return user_model.get_user_by_id(session['user_id'])
+    if g.get('current_user_oid_src') != session['user_id']:
+        g.current_user_oid = ObjectId(session['user_id'])
+        g.current_user_oid_src = session['user_id']
+    
+    return g.current_user_oid
+
+
+def get_current_plan():
+    """Get the current user's subscription plan, loaded at most once per request."""
+    from database.models import plan_model
+    
+    user = get_current_user()
+    plan_id = user['subscription'].get('planId') if user else None
+    if not plan_id:
+        return None
+    
+    if g.get('current_plan_id') != plan_id:
+        g.current_plan = plan_model.get_plan_by_id_cached(plan_id)
+        g.current_plan_id = plan_id
+    
+    return g.current_plan
+
+
+def forget_current_user():
+    """Drop the request's cached user so the next get_current_user() reloads it."""
+    g.pop('current_user', None)
+    g.pop('current_user_id', None)
 
 
 def render_error_page(error_code, message=None):
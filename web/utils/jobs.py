@@ -0,0 +1,140 @@
+"""
+Background job tracking for Travian Whispers web application.
+This module runs long browser-automation tasks on their own bounded worker
+pool and records their state in the shared cache so clients can poll for
+the result.
+
+Job state is only visible across worker processes when CACHE_REDIS_URL is
+set; with the in-memory cache a poll that reaches another process gets 404.
+"""
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from web.utils.cache import get_cache
+
+# Initialize logger
+logger = logging.getLogger(__name__)
+
+# Browser sessions run for tens of seconds, so they get their own pool rather
+# than the shared background pool used for payments and webhooks
+_executor = ThreadPoolExecutor(max_workers=config.BROWSER_JOB_WORKERS, thread_name_prefix='browser-job')
+
+# Caps running plus queued jobs; submissions beyond it are rejected
+_slots = threading.BoundedSemaphore(config.BROWSER_JOB_WORKERS + config.BROWSER_JOB_QUEUE_SIZE)
+
+if not config.CACHE_REDIS_URL:
+    logger.warning("CACHE_REDIS_URL is not set; background job state is only visible to the process that ran the job")
+
+# Job states, named after their Celery equivalents
+JOB_PENDING = 'PENDING'
+JOB_STARTED = 'STARTED'
+JOB_SUCCESS = 'SUCCESS'
+JOB_FAILURE = 'FAILURE'
+
+def _job_key(job_id):
+    """
+    Cache key for a job's state.
+    
+    Args:
+        job_id (str): Job ID
+    
+    Returns:
+        str: Cache key
+    """
+    return f"job:{job_id}"
+
+def _set_job(job_id, owner_id, state, result=None):
+    """
+    Record a job's state.
+    
+    Args:
+        job_id (str): Job ID
+        owner_id (str): ID of the user who started the job
+        state (str): Job state
+        result: JSON-serializable result, if any
+    """
+    get_cache().set(_job_key(job_id), {
+        'owner_id': owner_id,
+        'state': state,
+        'result': result
+    }, timeout=config.JOB_RESULT_TTL)
+
+def _run_job(job_id, owner_id, func, args):
+    """
+    Run a job, recording its state before and after.
+    
+    Args:
+        job_id (str): Job ID
+        owner_id (str): ID of the user who started the job
+        func: Callable to run
+        args (tuple): Positional arguments for the callable
+    """
+    try:
+        _set_job(job_id, owner_id, JOB_STARTED)
+        
+        try:
+            result = func(*args)
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}", exc_info=True)
+            _set_job(job_id, owner_id, JOB_FAILURE, {'success': False, 'message': 'Job failed'})
+            return
+        
+        _set_job(job_id, owner_id, JOB_SUCCESS, result)
+    except Exception as e:
+        logger.error(f"Error recording state for job {job_id}: {e}", exc_info=True)
+    finally:
+        _slots.release()
+
+def submit_job(owner_id, func, *args):
+    """
+    Start a job on the browser job pool.
+    
+    Arguments stay in process memory and are never written to the cache,
+    so jobs should look up credentials themselves rather than receive them.
+    
+    Args:
+        owner_id (str): ID of the user starting the job
+        func: Callable to run; must not rely on the Flask request or app context
+        *args: Positional arguments for the callable
+    
+    Returns:
+        str: Job ID, or None if the pool's queue is full
+    """
+    if not _slots.acquire(blocking=False):
+        logger.warning(f"Browser job queue is full; rejecting job for user {owner_id}")
+        return None
+    
+    job_id = uuid.uuid4().hex
+    
+    try:
+        _set_job(job_id, owner_id, JOB_PENDING)
+        _executor.submit(_run_job, job_id, owner_id, func, args)
+    except Exception:
+        _slots.release()
+        raise
+    
+    return job_id
+
+def get_job(job_id, owner_id):
+    """
+    Get a job's state.
+    
+    Args:
+        job_id (str): Job ID
+        owner_id (str): ID of the requesting user
+    
+    Returns:
+        dict: Job with 'state' and 'result' keys, or None if not found or owned by another user
+    """
+    job = get_cache().get(_job_key(job_id))
+    
+    if not job or job.get('owner_id') != owner_id:
+        return None
+    
+    return {
+        'state': job['state'],
+        'result': job.get('result')
+    }
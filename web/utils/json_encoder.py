@@ -6,6 +6,7 @@ import logging
 import json
 from bson import ObjectId
 from datetime import datetime
+from flask import current_app
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -57,18 +58,13 @@ def jsonify_custom(obj):
     """
     Create a Flask JSON response with custom serialization.
     
+    The app's JSON provider already encodes ObjectId and datetime values, so
+    the object is serialized once, straight into the response body.
+    
     Args:
         obj: Object to serialize
         
     Returns:
         JSON response object
     """
-    from flask import Response
-    
-    # First serialize the object to a JSON string
-    json_str = dumps(obj)
-    
-    # Create a Response object with the correct content type
-    response = Response(json_str, mimetype='application/json')
-    
-    return response
+    return current_app.json.response(obj)
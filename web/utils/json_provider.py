@@ -0,0 +1,85 @@
+"""
+JSON provider for Travian Whispers web application.
+This module plugs msgspec into Flask so jsonify() and request.get_json()
+use a fast encoder that understands MongoDB types.
+"""
+import msgspec
+from bson import ObjectId
+from flask.json.provider import JSONProvider
+
+def _enc_hook(obj):
+    """
+    Encode types msgspec does not support natively.
+
+    Args:
+        obj: Object to encode
+
+    Returns:
+        JSON-compatible object
+    """
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Type {type(obj)} not serializable")
+
+# Encoders and decoders are thread-safe and meant to be reused
+_encoder = msgspec.json.Encoder(enc_hook=_enc_hook)
+_decoder = msgspec.json.Decoder()
+
+class MsgspecJSONProvider(JSONProvider):
+    """
+    Flask JSON provider backed by msgspec.
+
+    Datetimes are encoded as ISO 8601 strings and ObjectIds as their hex string.
+    Output is always compact and keys keep their insertion order.
+    """
+
+    # Mirrors DefaultJSONProvider's settings; msgspec never sorts or indents
+    sort_keys = False
+    compact = True
+
+    def dumps(self, obj, **kwargs):
+        """
+        Serialize an object to a JSON string.
+
+        Args:
+            obj: Object to serialize
+            **kwargs: Ignored (accepted for Flask API compatibility)
+
+        Returns:
+            str: JSON string
+        """
+        return _encoder.encode(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        """
+        Deserialize a JSON string or bytes to a Python object.
+
+        Args:
+            s: JSON string or bytes
+            **kwargs: Ignored (accepted for Flask API compatibility)
+
+        Returns:
+            Deserialized Python object
+
+        Raises:
+            ValueError: If the input is not valid JSON, matching json.loads so
+                Flask answers malformed request bodies with 400
+        """
+        try:
+            return _decoder.decode(s)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+
+    def response(self, *args, **kwargs):
+        """
+        Build a JSON response, writing the encoded bytes directly.
+
+        Args:
+            *args: A single object or several values to serialize as a list
+            **kwargs: Values to serialize as an object
+
+        Returns:
+            Response: Flask response with application/json mimetype
+        """
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(_encoder.encode(obj), mimetype='application/json')